@@ -4,15 +4,33 @@ from langchain_community.utilities import SerpAPIWrapper
 from langchain.tools import Tool
 from langchain_ollama import ChatOllama
 from langchain.memory import ConversationBufferMemory
+import sys
+from pathlib import Path
+
+# search cache and query normalization shared with the capstone API
+sys.path.append(str(Path(__file__).resolve().parents[1] / "langchain-course-main/chapters/09-capstone/api"))
+from cache import TTLCache, normalize_query
 
 # LLM
 llm = ChatOllama(model="mistral", base_url="http://localhost:11434")
 
-# SerpAPI tool
+# SerpAPI tool, repeated queries are answered from the cache
 search = SerpAPIWrapper()
+search_cache = TTLCache(maxsize=512, ttl=60 * 60, path="search_cache.sqlite")
+
+
+def cached_search(query: str) -> str:
+    key = normalize_query(query)
+    result = search_cache.get(key)
+    if result is None:
+        result = search.run(query)
+        search_cache.set(key, result)
+    return result
+
+
 search_tool = Tool(
     name="search",
-    func=search.run,
+    func=cached_search,
     description="Useful for when you need to answer questions about current events or the web"
 )
 
@@ -36,3 +54,4 @@ agent_executor = AgentExecutor(agent=agent, tools=[search_tool], memory=memory,
 # Run
 response = agent_executor.invoke({"input": "Who is the current president of France?"})
 print(response)
+print("Search cache:", search_cache.stats())
@@ -0,0 +1,114 @@
+import asyncio
+import math
+import time
+from collections import deque
+
+from streaming import percentiles
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted, carrying the HTTP response to send."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class Permit:
+    """A slot held by one admitted request. Releasing it twice is harmless."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._acquired_at = time.perf_counter()
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release(time.perf_counter() - self._acquired_at)
+
+
+class AdmissionController:
+    """Bounded concurrency gate with a FIFO admission queue.
+
+    At most `max_concurrent` requests hold a permit at once. Further
+    requests wait in arrival order; once `max_queue` are waiting new ones
+    are turned away immediately (429), and a request that waits longer than
+    `max_wait` seconds gives up (503). Both carry a Retry-After estimate
+    based on the recent time a permit is held.
+    """
+
+    def __init__(self, max_concurrent: int = 32, max_queue: int = 64, max_wait: float = 10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        # moving average of how long a permit is held, seeds Retry-After
+        self._service_time = 5.0
+        self._wait_times: deque[float] = deque(maxlen=2048)
+        self.counters = {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        backlog = (self.queue_depth + 1) / self.max_concurrent
+        return max(1, math.ceil(self._service_time * backlog))
+
+    def _admit(self, waited: float) -> Permit:
+        self.counters["admitted"] += 1
+        self._wait_times.append(waited)
+        return Permit(self)
+
+    async def acquire(self) -> Permit:
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            return self._admit(0.0)
+        if len(self._waiters) >= self.max_queue:
+            self.counters["rejected_queue_full"] += 1
+            raise AdmissionRejected(429, "Too many requests queued", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            # a releasing request hands its slot straight to the waiter
+            await asyncio.wait_for(waiter, timeout=self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # the slot arrived as we gave up, pass it on
+                self._release(None)
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.counters["rejected_timeout"] += 1
+            raise AdmissionRejected(503, "Server is at capacity", self.retry_after()) from None
+        return self._admit(time.perf_counter() - started)
+
+    def _release(self, held: float | None) -> None:
+        if held is not None:
+            self._service_time = 0.9 * self._service_time + 0.1 * held
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "active": self._active,
+            "queue_depth": self.queue_depth,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "wait_time": percentiles(list(self._wait_times)),
+        }
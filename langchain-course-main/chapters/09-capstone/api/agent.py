@@ -1,19 +1,33 @@
 import asyncio
-import aiohttp
 import os
+import time
 
 from langchain.callbacks.base import AsyncCallbackHandler
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.messages import AIMessage, HumanMessage, ToolCall, ToolMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import ConfigurableField
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, SecretStr
+import metrics
+from cache import TTLCache, normalize_query
+from history import TokenBudgetHistory
+from http_client import http_client
+from session_store import SessionStore
+from speculative import SpeculativeToolRunner
+from streaming import DONE, STEP_END, StreamChannel
 
 
 # Constants and Configuration
 OPENAI_API_KEY = SecretStr(os.environ["OPENAI_API_KEY"])
 SERPAPI_API_KEY = SecretStr(os.environ["SERPAPI_API_KEY"])
+# overridable so benchmarks can point the tool at a local stand-in
+SERPAPI_URL = os.environ.get("SERPAPI_URL", "https://serpapi.com/search")
+# search results are cached in memory, and on disk when a path is set
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", 60 * 60))
+SEARCH_CACHE_PATH = os.environ.get("SEARCH_CACHE_PATH")
+
+search_cache = TTLCache(maxsize=1024, ttl=SEARCH_CACHE_TTL, path=SEARCH_CACHE_PATH)
 
 # LLM and Prompt Setup
 llm = ChatOpenAI(
@@ -85,18 +99,24 @@ async def subtract(x: float, y: float) -> float:
 @tool
 async def serpapi(query: str) -> list[Article]:
     """Use this tool to search the web."""
+    cache_key = normalize_query(query)
+    if (organic_results := await search_cache.aget(cache_key)) is not None:
+        return [Article.from_serpapi_result(result) for result in organic_results]
     params = {
         "api_key": SERPAPI_API_KEY.get_secret_value(),
         "engine": "google",
         "q": query,
     }
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            "https://serpapi.com/search",
-            params=params
-        ) as response:
-            results = await response.json()
-    return [Article.from_serpapi_result(result) for result in results["organic_results"]]
+    # the pooled session keeps connections to serpapi alive between calls
+    session = await http_client.session()
+    async with session.get(
+        SERPAPI_URL,
+        params=params
+    ) as response:
+        results = await response.json()
+    organic_results = results["organic_results"]
+    await search_cache.aset(cache_key, organic_results)
+    return [Article.from_serpapi_result(result) for result in organic_results]
 
 @tool
 async def final_answer(answer: str, tools_used: list[str]) -> dict[str, str | list[str]]:
@@ -109,66 +129,169 @@ name2tool = {tool.name: tool.coroutine for tool in tools}
 
 # Streaming Handler
 class QueueCallbackHandler(AsyncCallbackHandler):
-    def __init__(self, queue: asyncio.Queue):
-        self.queue = queue
+    def __init__(self, channel: StreamChannel | None = None):
+        self.channel = channel or StreamChannel()
         self.final_answer_seen = False
+        # per LLM step timing: start time, first token time and token count
+        self.created_at = time.perf_counter()
+        self.first_token_at: float | None = None
+        self._steps: dict = {}
 
     async def __aiter__(self):
-        while True:
-            if self.queue.empty():
-                await asyncio.sleep(0.1)
-                continue
-            token_or_done = await self.queue.get()
-            if token_or_done == "<<DONE>>":
-                return
-            if token_or_done:
-                yield token_or_done
+        async for token_or_done in self.channel:
+            yield token_or_done
     
+    async def on_chat_model_start(self, *args, **kwargs) -> None:
+        self._steps[kwargs.get("run_id")] = [time.perf_counter(), None, 0]
+
     async def on_llm_new_token(self, *args, **kwargs) -> None:
+        now = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = now
+            metrics.time_to_first_token.observe(now - self.created_at)
+        if step := self._steps.get(kwargs.get("run_id")):
+            step[1] = step[1] or now
+            step[2] += 1
         chunk = kwargs.get("chunk")
         if chunk and chunk.message.additional_kwargs.get("tool_calls"):
             if chunk.message.additional_kwargs["tool_calls"][0]["function"]["name"] == "final_answer":
                 self.final_answer_seen = True
-        self.queue.put_nowait(kwargs.get("chunk"))
+        # awaiting the put lets a full buffer slow the LLM stream down
+        await self.channel.put(kwargs.get("chunk"))
     
     async def on_llm_end(self, *args, **kwargs) -> None:
+        if step := self._steps.pop(kwargs.get("run_id"), None):
+            started, first_token, tokens = step
+            now = time.perf_counter()
+            metrics.llm_step_seconds.observe(now - started)
+            if first_token is not None and now > first_token:
+                metrics.tokens_per_second.observe(tokens / (now - first_token))
         if self.final_answer_seen:
-            self.queue.put_nowait("<<DONE>>")
+            await self.channel.put(DONE)
         else:
-            self.queue.put_nowait("<<STEP_END>>")
+            await self.channel.put(STEP_END)
 
-async def execute_tool(tool_call: AIMessage) -> ToolMessage:
-    tool_name = tool_call.tool_calls[0]["name"]
-    tool_args = tool_call.tool_calls[0]["args"]
-    tool_out = await name2tool[tool_name](**tool_args)
+async def execute_tool(tool_call: ToolCall, timeout: float | None = None) -> ToolMessage:
+    tool_name = tool_call["name"]
+    tool_args = tool_call["args"]
+    started = time.perf_counter()
+    try:
+        tool_out = await asyncio.wait_for(name2tool[tool_name](**tool_args), timeout=timeout)
+    except asyncio.TimeoutError:
+        # report the timeout back to the LLM rather than failing the whole step
+        tool_out = f"The {tool_name} tool timed out after {timeout} seconds."
+    except asyncio.CancelledError:
+        metrics.cancelled_tool_calls.inc()
+        raise
+    finally:
+        metrics.tool_seconds.observe(time.perf_counter() - started, tool_name)
     return ToolMessage(
         content=f"{tool_out}",
-        tool_call_id=tool_call.tool_calls[0]["id"]
+        tool_call_id=tool_call["id"]
     )
 
+# Agent runnable, shared by every executor as it holds no per-session state
+agent = (
+    {
+        "input": lambda x: x["input"],
+        "chat_history": lambda x: x["chat_history"],
+        "agent_scratchpad": lambda x: x.get("agent_scratchpad", [])
+    }
+    | prompt
+    | llm.bind_tools(tools, tool_choice="any")
+)
+
 # Agent Executor
 class CustomAgentExecutor:
-    def __init__(self, max_iterations: int = 3):
-        self.chat_history: list[BaseMessage] = []
-        self.max_iterations = max_iterations
-        self.agent = (
-            {
-                "input": lambda x: x["input"],
-                "chat_history": lambda x: x["chat_history"],
-                "agent_scratchpad": lambda x: x.get("agent_scratchpad", [])
-            }
-            | prompt
-            | llm.bind_tools(tools, tool_choice="any")
+    def __init__(
+        self,
+        session_id: str | None = None,
+        store: SessionStore | None = None,
+        max_iterations: int = 3,
+        history_tokens: int = 2000,
+        summarize_history: bool = False,
+        tool_timeout: float = 30.0,
+        max_concurrent_tools: int = 8,
+        speculative_tools: bool = False,
+    ):
+        # recent turns kept verbatim within a token budget; older turns are
+        # dropped, or folded into a summary in the background when enabled
+        self.chat_history = TokenBudgetHistory(
+            max_tokens=history_tokens,
+            summarizer=llm if summarize_history else None,
         )
+        # with a shared store the history is reloaded on every request, as
+        # other workers may have added turns to the same session
+        self.session_id = session_id
+        self.store = store
+        if store is not None:
+            self.chat_history.on_summary = lambda summary: store.set_summary(session_id, summary)
+        self.max_iterations = max_iterations
+        # per tool call timeout (seconds) and cap on tool calls running at once
+        self.tool_timeout = tool_timeout
+        self.max_concurrent_tools = max_concurrent_tools
+        # opt-in: start tools as soon as their streamed arguments are complete
+        self.speculative_tools = speculative_tools
+        # requests within one session run one at a time so history stays ordered
+        self.lock = asyncio.Lock()
+        self.agent = agent
+
+    async def run_tool(self, tool_call: ToolCall, semaphore: asyncio.Semaphore) -> ToolMessage:
+        async with semaphore:
+            return await execute_tool(tool_call, timeout=self.tool_timeout)
+
+    async def execute_tools(
+        self,
+        tool_calls: list[AIMessage],
+        speculative: SpeculativeToolRunner | None = None,
+        semaphore: asyncio.Semaphore | None = None,
+    ) -> list[ToolMessage]:
+        """Run every tool call emitted in a step concurrently, results in call order.
+
+        Calls already started by `speculative` while the LLM was streaming are
+        awaited instead of being run again. Pass the `semaphore` the
+        speculative runner uses so both stay under `max_concurrent_tools`.
+        """
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrent_tools)
+        calls = [call for message in tool_calls for call in message.tool_calls]
+        stream_end = time.perf_counter()
+        started = speculative.resolve(calls) if speculative is not None else {}
+        durations: dict[str, float] = {}
+
+        async def run(tool_call: ToolCall) -> ToolMessage:
+            if (task := started.get(tool_call["id"])) is not None:
+                # the real duration is taken from the speculative task's timing
+                durations[tool_call["id"]] = 0.0
+                return await task
+            tool_start = time.perf_counter()
+            tool_message = await self.run_tool(tool_call, semaphore)
+            durations[tool_call["id"]] = time.perf_counter() - tool_start
+            return tool_message
+
+        tool_messages = await asyncio.gather(*[run(call) for call in calls])
+        if speculative is not None:
+            speculative.record_step(stream_end, time.perf_counter(), durations)
+        return tool_messages
 
     async def invoke(self, input: str, streamer: QueueCallbackHandler, verbose: bool = False) -> dict:
+        async with self.lock:
+            return await self._invoke(input, streamer, verbose)
+
+    async def _invoke(self, input: str, streamer: QueueCallbackHandler, verbose: bool = False) -> dict:
         # invoke the agent but we do this iteratively in a loop until
         # reaching a final answer
         count = 0
         final_answer: str | None = None
+        found_final_answer = False
         agent_scratchpad: list[AIMessage | ToolMessage] = []
+        if self.store is not None:
+            summary, turns = await self.store.load(self.session_id)
+            self.chat_history.load(turns, summary)
+        chat_history = self.chat_history.messages
+        metrics.history_tokens.observe(self.chat_history.tokens)
         # streaming function
-        async def stream(query: str) -> list[AIMessage]:
+        async def stream(query: str, speculative: SpeculativeToolRunner | None = None) -> list[AIMessage]:
             response = self.agent.with_config(
                 callbacks=[streamer]
             )
@@ -178,9 +301,11 @@ class CustomAgentExecutor:
             # now we begin streaming
             async for token in response.astream({
                 "input": query,
-                "chat_history": self.chat_history,
+                "chat_history": chat_history,
                 "agent_scratchpad": agent_scratchpad
             }):
+                if speculative is not None and token.tool_call_chunks:
+                    speculative.feed(token.tool_call_chunks)
                 tool_calls = token.additional_kwargs.get("tool_calls")
                 if tool_calls:
                     # first check if we have a tool call id - this indicates a new tool
@@ -199,26 +324,33 @@ class CustomAgentExecutor:
             ]
 
         while count < self.max_iterations:
-            # invoke a step for the agent to generate a tool call
-            tool_calls = await stream(query=input)
-            # gather tool execution coroutines
-            tool_obs = await asyncio.gather(
-                *[execute_tool(tool_call) for tool_call in tool_calls]
-            )
-            # append tool calls and tool observations to the scratchpad in order
-            id2tool_obs = {tool_call.tool_call_id: tool_obs for tool_call, tool_obs in zip(tool_calls, tool_obs)}
+            # shared by speculative and regular tool calls of this step
+            semaphore = asyncio.Semaphore(self.max_concurrent_tools)
+            speculative = None
+            if self.speculative_tools:
+                speculative = SpeculativeToolRunner(lambda call: self.run_tool(call, semaphore))
+            try:
+                # invoke a step for the agent to generate a tool call
+                tool_calls = await stream(query=input, speculative=speculative)
+                # execute every tool call from this step concurrently
+                tool_obs = iter(await self.execute_tools(tool_calls, speculative, semaphore))
+            finally:
+                # drop anything started speculatively that was not awaited
+                if speculative is not None:
+                    speculative.cancel()
+            if verbose and speculative is not None:
+                print(f"Step {count}: speculative tool execution saved {speculative.time_saved:.3f}s")
+            # append each tool call message followed by its observations, in order
             for tool_call in tool_calls:
-                agent_scratchpad.extend([
-                    tool_call,
-                    id2tool_obs[tool_call.tool_call_id]
-                ])
+                agent_scratchpad.append(tool_call)
+                agent_scratchpad.extend(next(tool_obs) for _ in tool_call.tool_calls)
             
             count += 1
             # if the tool call is the final answer tool, we stop
             found_final_answer = False
-            for tool_call in tool_calls:
-                if tool_call.tool_calls[0]["name"] == "final_answer":
-                    final_answer_call = tool_call.tool_calls[0]
+            for call in (call for tool_call in tool_calls for call in tool_call.tool_calls):
+                if call["name"] == "final_answer":
+                    final_answer_call = call
                     final_answer = final_answer_call["args"]["answer"]
                     found_final_answer = True
                     break
@@ -227,13 +359,18 @@ class CustomAgentExecutor:
             if found_final_answer:
                 break
             
+        metrics.iterations.observe(count)
+        if not found_final_answer:
+            metrics.max_iterations_exhausted.inc()
+        if not final_answer:
+            metrics.no_answer.inc()
         # add the final output to the chat history, we only add the "answer" field
-        self.chat_history.extend([
+        turn = [
             HumanMessage(content=input),
             AIMessage(content=final_answer if final_answer else "No answer found")
-        ])
+        ]
+        tokens = self.chat_history.add_turn(turn)
+        if self.store is not None:
+            await self.store.append(self.session_id, turn, tokens)
         # return the final answer in dict form
-        return final_answer_call if final_answer else {"answer": "No answer found", "tools_used": []}
-
-# Initialize agent executor
-agent_executor = CustomAgentExecutor()  
\ No newline at end of file
+        return final_answer_call["args"] if final_answer else {"answer": "No answer found", "tools_used": []}
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any
+
+
+def normalize_query(query: str) -> str:
+    """Key for a search query, so trivially different phrasings share an entry.
+
+    Case, spacing and trailing punctuation are ignored. Every search cache
+    in the repo keys on this, so they agree on what counts as the same query.
+    """
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = re.sub(r"\s+", " ", query).strip()
+    return query.strip(" ?!.,;:")
+
+
+class SQLiteCacheTier:
+    """On-disk cache tier, values are stored as JSON with an absolute expiry."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at <= time.time():
+            self.delete(key)
+            return None
+        return json.loads(value), expires_at
+
+    def set(self, key: str, value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class TTLCache:
+    """LRU cache with per-entry TTLs and an optional SQLite tier behind it.
+
+    Lookups hit the in-memory tier first; on a miss the SQLite tier (when a
+    `path` is given) is read off the event loop and a hit there is promoted
+    back into memory. Values must be JSON serializable to use the disk tier.
+    get/set are the blocking equivalents of aget/aset for synchronous code.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600, path: str | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[Any, float]] = OrderedDict()
+        self.disk = SQLiteCacheTier(path) if path else None
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def _put(self, key: str, value: Any, expires_at: float) -> None:
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def get_memory(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _disk_hit(self, key: str, entry: tuple[Any, float] | None) -> Any | None:
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["disk_hits"] += 1
+        self._put(key, *entry)
+        return entry[0]
+
+    def get(self, key: str) -> Any | None:
+        """Like aget, for synchronous callers: the disk tier is read inline."""
+        value = self.get_memory(key)
+        if value is not None:
+            self.counters["hits"] += 1
+            return value
+        return self._disk_hit(key, self.disk.get(key) if self.disk is not None else None)
+
+    async def aget(self, key: str) -> Any | None:
+        value = self.get_memory(key)
+        if value is not None:
+            self.counters["hits"] += 1
+            return value
+        entry = await asyncio.to_thread(self.disk.get, key) if self.disk is not None else None
+        return self._disk_hit(key, entry)
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._put(key, value, expires_at)
+        if self.disk is not None:
+            self.disk.set(key, value, expires_at)
+
+    async def aset(self, key: str, value: Any, ttl: float | None = None) -> None:
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._put(key, value, expires_at)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value, expires_at)
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "hit_rate": (lookups - self.counters["misses"]) / lookups if lookups else None,
+        }
@@ -0,0 +1,129 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+try:
+    import tiktoken
+
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text, disallowed_special=()))
+except ImportError:  # pragma: no cover - tiktoken ships with langchain-openai
+    def count_tokens(text: str) -> int:
+        # roughly four characters per token for English text
+        return len(text) // 4 + 1
+
+# rough per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = (
+    "Given the existing conversation summary and the new messages, generate a "
+    "new, concise summary of the conversation, keeping names, facts and open "
+    "questions.\n\nExisting summary:\n{summary}\n\nNew messages:\n{messages}"
+)
+
+
+class TokenBudgetHistory:
+    """Chat history that keeps the most recent turns within a token budget.
+
+    Each message's token count is computed once, when it is added, and a
+    running total is kept, so trimming never re-tokenizes the history. When
+    the total goes over `max_tokens` the oldest turns are dropped (the latest
+    turn is always kept). If a `summarizer` LLM is given, dropped turns are
+    folded into a running summary in a background task, so the request that
+    caused the trim does not wait for it; `on_summary` is awaited with each
+    new summary so it can be persisted.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        summarizer: BaseChatModel | None = None,
+        counter: Callable[[str], int] = count_tokens,
+    ):
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.counter = counter
+        self._turns: deque[tuple[list[BaseMessage], int]] = deque()
+        self.tokens = 0
+        self.summary: str | None = None
+        self.on_summary: Callable[[str], Awaitable[None]] | None = None
+        self._summary_lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    def _message_tokens(self, message: BaseMessage) -> int:
+        return self.counter(str(message.content)) + MESSAGE_OVERHEAD
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        messages: list[BaseMessage] = []
+        if self.summary is not None:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation: {self.summary}"))
+        for turn, _ in self._turns:
+            messages.extend(turn)
+        return messages
+
+    def load(self, turns: list[tuple[list[BaseMessage], int]], summary: str | None = None) -> None:
+        """Replace the history with stored turns (and their token counts).
+
+        Only the newest turns that fit the budget are kept; older ones are
+        already covered by the stored summary, so they are not summarized again.
+        """
+        self._turns.clear()
+        self.tokens = 0
+        for turn, tokens in reversed(turns):
+            if self._turns and self.tokens + tokens > self.max_tokens:
+                break
+            self._turns.appendleft((turn, tokens))
+            self.tokens += tokens
+        self.summary = summary
+
+    def add_turn(self, messages: list[BaseMessage]) -> int:
+        """Add one exchange (e.g. a human message and the AI answer).
+
+        Returns the token count of the new turn.
+        """
+        tokens = sum(self._message_tokens(m) for m in messages)
+        self._turns.append((messages, tokens))
+        self.tokens += tokens
+        dropped: list[BaseMessage] = []
+        while self.tokens > self.max_tokens and len(self._turns) > 1:
+            turn, turn_tokens = self._turns.popleft()
+            self.tokens -= turn_tokens
+            dropped.extend(turn)
+        if dropped and self.summarizer is not None:
+            task = asyncio.get_running_loop().create_task(self._summarize(dropped))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return tokens
+
+    async def _summarize(self, dropped: list[BaseMessage]) -> None:
+        # summaries are applied one at a time so none of them is lost
+        async with self._summary_lock:
+            lines = "\n".join(
+                f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}" for m in dropped
+            )
+            prompt = SUMMARY_PROMPT.format(
+                summary=self.summary or "",
+                messages=lines,
+            )
+            try:
+                result = await self.summarizer.ainvoke([HumanMessage(content=prompt)])
+            except Exception as e:
+                print(f"Error summarizing chat history: {e}")
+                return
+            self.summary = result.content
+            if self.on_summary is not None:
+                try:
+                    await self.on_summary(self.summary)
+                except Exception as e:
+                    print(f"Error saving chat history summary: {e}")
+
+    def clear(self) -> None:
+        self._turns.clear()
+        self.tokens = 0
+        self.summary = None
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import aiohttp
+
+
+class PooledHttpClient:
+    """One keep-alive `aiohttp.ClientSession` shared by all async tools.
+
+    The connector pools connections (at most `limit` in total and
+    `limit_per_host` to a single host) and caches DNS lookups for `dns_ttl`
+    seconds. Trace hooks count how often a pooled connection is reused so
+    the reuse rate can be checked in production.
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        dns_ttl: int = 300,
+        keepalive_timeout: float = 30.0,
+        timeout: float = 20.0,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self._session: aiohttp.ClientSession | None = None
+        self.counters = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "pool_waits": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        def count(name: str):
+            async def hook(session, context: SimpleNamespace, params) -> None:
+                self.counters[name] += 1
+            return hook
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(count("requests"))
+        trace_config.on_connection_create_end.append(count("connections_created"))
+        trace_config.on_connection_reuseconn.append(count("connections_reused"))
+        trace_config.on_connection_queued_start.append(count("pool_waits"))
+        trace_config.on_dns_cache_hit.append(count("dns_cache_hits"))
+        trace_config.on_dns_cache_miss.append(count("dns_cache_misses"))
+        return trace_config
+
+    async def start(self) -> None:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[self._trace_config()],
+            )
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def session(self) -> aiohttp.ClientSession:
+        """Return the shared session, opening it if the app lifespan has not."""
+        await self.start()
+        return self._session
+
+    def stats(self) -> dict:
+        connections = self.counters["connections_created"] + self.counters["connections_reused"]
+        return {
+            **self.counters,
+            "reuse_rate": self.counters["connections_reused"] / connections if connections else None,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "open": self._session is not None and not self._session.closed,
+        }
+
+
+http_client = PooledHttpClient()
@@ -1,12 +1,85 @@
 import asyncio
+import os
+import uuid
+from contextlib import asynccontextmanager
 
-from agent import QueueCallbackHandler, agent_executor
-from fastapi import FastAPI
-from fastapi.responses import StreamingResponse
+from admission import AdmissionController, AdmissionRejected, Permit
+from agent import CustomAgentExecutor, QueueCallbackHandler, search_cache
+from http_client import http_client
+from partial_json import JSONObjectStream
+import metrics
+from session_store import open_session_store
+from sessions import SessionRegistry
+from speculative import speculation_stats
+from streaming import FLUSH, STEP_END, SSEFramer, StreamChannel, stream_metrics
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 
+# max number of chunks buffered per response before the LLM stream is paused
+STREAM_BUFFER_SIZE = 256
+# tool argument fragments arriving within this many seconds go out as one frame
+SSE_COALESCE_WINDOW = 0.01
+# session registry limits: sessions kept in memory, idle timeout in seconds
+MAX_SESSIONS = 1000
+SESSION_TTL = 30 * 60
+# start tools while the LLM is still streaming the rest of its tool calls
+SPECULATIVE_TOOLS = False
+# chat history sent with each request is capped at this many tokens; older
+# turns are summarized in the background instead of dropped when enabled
+HISTORY_TOKEN_BUDGET = 2000
+SUMMARIZE_HISTORY = False
+# shared session state for running several workers: "sqlite:///sessions.sqlite",
+# "redis://localhost:6379/0", or unset to keep history in process memory
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "")
+# admission control: agent runs at once, requests allowed to queue, max queue wait (s)
+MAX_CONCURRENT_AGENTS = 32
+ADMISSION_QUEUE_SIZE = 64
+ADMISSION_MAX_WAIT = 10.0
+
+admission = AdmissionController(
+    max_concurrent=MAX_CONCURRENT_AGENTS,
+    max_queue=ADMISSION_QUEUE_SIZE,
+    max_wait=ADMISSION_MAX_WAIT,
+)
+
+session_store = open_session_store(SESSION_BACKEND)
+
+# one executor (and so one chat history) per session
+sessions: SessionRegistry[CustomAgentExecutor] = SessionRegistry(
+    lambda session_id: CustomAgentExecutor(
+        session_id=session_id,
+        store=session_store,
+        speculative_tools=SPECULATIVE_TOOLS,
+        history_tokens=HISTORY_TOKEN_BUDGET,
+        summarize_history=SUMMARIZE_HISTORY,
+    ),
+    max_sessions=MAX_SESSIONS,
+    ttl=SESSION_TTL,
+)
+
+# open the shared HTTP connection pool (and session store) on startup, close on shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await http_client.start()
+    if session_store is not None:
+        await session_store.start()
+    yield
+    await http_client.close()
+    if session_store is not None:
+        await session_store.close()
+
+# point-in-time gauges read from the components above on every scrape
+metrics.registry.gauge("admission_active", "Agent runs holding an admission slot", lambda: admission.stats()["active"])
+metrics.registry.gauge("admission_queue_depth", "Requests waiting for an admission slot", lambda: admission.queue_depth)
+metrics.registry.gauge("sessions", "Sessions held in the registry", lambda: len(sessions))
+metrics.registry.gauge("streams_active", "Responses currently streaming", lambda: stream_metrics.active)
+metrics.registry.gauge("http_pool_reuse_rate", "Share of HTTP requests on a reused connection", lambda: http_client.stats()["reuse_rate"])
+metrics.registry.gauge("search_cache_hit_rate", "Share of web searches answered from cache", lambda: search_cache.stats()["hit_rate"])
+
 # initilizing our application
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,44 +87,136 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Session-ID", "Retry-After"],  # session reuse and backoff hints
 )
 
-# streaming function
-async def token_generator(content: str, streamer: QueueCallbackHandler):
-    task = asyncio.create_task(agent_executor.invoke(
+# frames for a fragment of the final_answer tool's arguments
+def final_answer_frames(parser: JSONObjectStream, framer: SSEFramer, tool_args: str) -> str:
+    frames = ""
+    for kind, key, value in parser.feed(tool_args):
+        if kind == "delta" and key == "answer":
+            frames += framer.delta("answer_delta", value)
+        elif kind == "value" and key == "tools_used":
+            frames += framer.event("tools_used", {"tools_used": value})
+    return frames
+
+# streaming function, the response is a stream of typed server-sent events:
+#   step_start   {"name"}        a tool call begins
+#   args_delta   {"delta"}       a fragment of the tool call's JSON arguments
+#   answer_delta {"delta"}       plain text of the final answer as it is written
+#   tools_used   {"tools_used"}  the final answer's list of tools, once complete
+#   step_end     {}              the LLM finished this step
+#   final        {"answer", "tools_used"}
+async def token_generator(content: str, executor: CustomAgentExecutor, streamer: QueueCallbackHandler, permit: Permit, request: Request, verbose: bool = True):
+    task = asyncio.create_task(executor.invoke(
         input=content,
         streamer=streamer,
-        verbose=True  # set to True to see verbose output in console
+        verbose=verbose  # set to True to see verbose output in console
     ))
-    # initialize various components to stream
-    async for token in streamer:
-        try:
-            if token == "<<STEP_END>>":
-                # send end of step token
-                yield "</step>"
-            elif tool_calls := token.message.additional_kwargs.get("tool_calls"):
-                if tool_name := tool_calls[0]["function"]["name"]:
-                    # send start of step token followed by step name tokens
-                    yield f"<step><step_name>{tool_name}</step_name>"
-                if tool_args := tool_calls[0]["function"]["arguments"]:
-                    # tool args are streamed directly, ensure it's properly encoded
-                    yield tool_args
-        except Exception as e:
-            print(f"Error streaming token: {e}")
-            continue
-    await task
+    # end the stream however the agent finishes, including errors and cancellation
+    task.add_done_callback(lambda _: streamer.channel.close())
+    watcher = asyncio.create_task(cancel_on_disconnect(request, task))
+    try:
+        framer = SSEFramer(streamer.channel.stats, window=SSE_COALESCE_WINDOW)
+        # the final answer's arguments are parsed as they stream, so the client
+        # gets plain text instead of re-parsing a growing JSON buffer
+        answer_parser: JSONObjectStream | None = None
+        # initialize various components to stream
+        async for token in framer.paced(streamer):
+            try:
+                if token == FLUSH:
+                    # fragments buffered for the whole coalescing window
+                    yield framer.flush()
+                elif token == STEP_END:
+                    yield framer.event("step_end", {})
+                elif tool_calls := token.message.additional_kwargs.get("tool_calls"):
+                    if tool_name := tool_calls[0]["function"]["name"]:
+                        answer_parser = JSONObjectStream({"answer"}) if tool_name == "final_answer" else None
+                        yield framer.event("step_start", {"name": tool_name})
+                    if tool_args := tool_calls[0]["function"]["arguments"]:
+                        if answer_parser is None:
+                            frame = framer.delta("args_delta", tool_args)
+                        else:
+                            frame = final_answer_frames(answer_parser, framer, tool_args)
+                        if frame:
+                            yield frame
+            except Exception as e:
+                print(f"Error streaming token: {e}")
+                continue
+        if task.cancelled():
+            return
+        final = await task
+        yield framer.event("final", final)
+        if verbose:
+            print(f"Stream stats: {streamer.channel.stats.as_dict()}")
+    finally:
+        watcher.cancel()
+        # the response was abandoned (e.g. the write failed), stop the agent too
+        cancel_run(task)
+        permit.release()
+
+# a cancelled task only finishes at its next step, so the disconnect watcher
+# and the generator's cleanup can both see it running; count each run once
+def cancel_run(task: asyncio.Task) -> None:
+    if not task.done() and not task.cancelling():
+        task.cancel()
+        metrics.cancelled_requests.inc()
+
+# cancels the agent run (its tool calls and the upstream LLM stream with it)
+# as soon as the client goes away, rather than at the next write
+async def cancel_on_disconnect(request: Request, task: asyncio.Task):
+    while not task.done():
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            cancel_run(task)
+            return
 
 # invoke function
 @app.post("/invoke")
-async def invoke(content: str):
-    queue: asyncio.Queue = asyncio.Queue()
-    streamer = QueueCallbackHandler(queue)
+async def invoke(request: Request, content: str, session_id: str | None = None):
+    # wait for a free agent slot, or turn the request away when saturated
+    try:
+        permit = await admission.acquire()
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    # a new session is started when the client does not send one
+    session_id = session_id or uuid.uuid4().hex
+    executor = sessions.get(session_id)
+    streamer = QueueCallbackHandler(StreamChannel(maxsize=STREAM_BUFFER_SIZE))
     # return the streaming response
     return StreamingResponse(
-        token_generator(content, streamer),
+        token_generator(content, executor, streamer, permit, request),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-        }
+            "X-Session-ID": session_id,
+        },
+        # releases the slot even if the stream never started
+        background=BackgroundTask(permit.release),
     )
+
+# streaming stats (time-to-first-byte, inter-token gaps), session registry,
+# HTTP connection pool, search cache, speculative tool execution and admission
+# control counters
+@app.get("/stats")
+async def stats():
+    return {
+        "streams": stream_metrics.snapshot(),
+        "sessions": sessions.stats(),
+        "session_store": session_store.stats() if session_store is not None else None,
+        "http_pool": http_client.stats(),
+        "search_cache": search_cache.stats(),
+        "speculation": speculation_stats,
+        "admission": admission.stats(),
+    }
+
+
+# latency histograms and counters for the agent pipeline, Prometheus text format
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return metrics.registry.render()
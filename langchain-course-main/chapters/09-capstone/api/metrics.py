@@ -0,0 +1,135 @@
+from bisect import bisect_left
+from typing import Callable
+
+# default latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _labels(label: str | None, value: str | None, extra: str = "") -> str:
+    pairs = [f'{label}="{value}"'] if label and value is not None else []
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Fixed-bucket histogram, optionally split by the value of one label.
+
+    Observing is a bisect and two additions, cheap enough to sit on the
+    token path.
+    """
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS, label: str | None = None):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.label = label
+        # label value -> [bucket counts..., +Inf count], sum
+        self._series: dict[str | None, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, label_value: str | None = None) -> None:
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _labels(self.label, label_value, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label, label_value)} {total[0]}")
+            lines.append(f"{self.name}_count{_labels(self.label, label_value)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter", f"{self.name} {self.value}"]
+
+
+class Gauge:
+    """Value read from a callable at scrape time."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float | None]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> list[str]:
+        value = self.read()
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if value is not None:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Histogram | Counter | Gauge] = {}
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS, label: str | None = None) -> Histogram:
+        return self._register(Histogram(name, help, buckets, label))
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._register(Counter(name, help))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float | None]) -> Gauge:
+        return self._register(Gauge(name, help, read))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# agent pipeline metrics
+time_to_first_token = registry.histogram(
+    "agent_time_to_first_token_seconds", "Time from request start to the first streamed LLM token"
+)
+tokens_per_second = registry.histogram(
+    "agent_llm_tokens_per_second",
+    "Streamed tokens per second within one LLM step",
+    buckets=(5, 10, 20, 40, 60, 80, 100, 150, 200, 300),
+)
+llm_step_seconds = registry.histogram("agent_llm_step_seconds", "Duration of one LLM step")
+tool_seconds = registry.histogram("agent_tool_seconds", "Duration of one tool call", label="tool")
+iterations = registry.histogram(
+    "agent_iterations", "Agent loop iterations per request", buckets=(1, 2, 3, 4, 5, 10)
+)
+max_iterations_exhausted = registry.counter(
+    "agent_max_iterations_exhausted_total", "Requests that hit max_iterations without a final answer"
+)
+no_answer = registry.counter("agent_no_answer_total", "Requests that returned 'No answer found'")
+history_tokens = registry.histogram(
+    "agent_history_tokens",
+    "Tokens of chat history sent with each request",
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000),
+)
+cancelled_requests = registry.counter(
+    "agent_cancelled_requests_total", "Agent runs cancelled because the client disconnected"
+)
+cancelled_tool_calls = registry.counter(
+    "agent_cancelled_tool_calls_total", "In-flight tool calls cancelled, by a disconnect or as a discarded speculative run"
+)
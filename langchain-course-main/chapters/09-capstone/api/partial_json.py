@@ -0,0 +1,203 @@
+"""Incremental parser for a JSON object that arrives in fragments.
+
+Tool-call arguments are streamed as arbitrary slices of a JSON object.
+Rather than re-parsing the growing buffer on every chunk, `JSONObjectStream`
+keeps its position and state between `feed` calls, so total work is linear
+in the size of the object. String fields named in `stream_keys` are decoded
+as they arrive and reported as text deltas; every other field is reported
+once, as a decoded value, when it is complete.
+
+Only depends on the standard library, so it can be reused outside the API
+(see `stream/app_stream_agent.py`).
+"""
+import json
+import re
+
+# characters that end a run of plain text inside a JSON string
+_STRING_SPECIAL = re.compile(r'["\\]')
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_WHITESPACE = " \t\r\n"
+
+# parser states
+_START, _KEY_OR_END, _KEY, _COLON, _VALUE, _STREAM_STRING, _RAW_VALUE, _AFTER_VALUE, _END = range(9)
+
+
+class JSONObjectStream:
+    """Parses one top-level JSON object fed in arbitrary fragments.
+
+    `feed` returns a list of `(kind, key, value)` events:
+      - `("delta", key, text)` for newly decoded text of a streamed string field
+      - `("value", key, value)` when any field is complete (for streamed
+        fields the value is the full string)
+    """
+
+    def __init__(self, stream_keys: set[str] | frozenset[str] = frozenset()):
+        self.stream_keys = stream_keys
+        self.done = False
+        self._state = _START
+        self._key_raw: list[str] = []
+        self._key = ""
+        # streamed string value: decoded parts and a pending escape sequence
+        self._text: list[str] = []
+        self._escape = ""
+        self._high_surrogate: str | None = None
+        # any other value: raw text plus nesting and string tracking
+        self._raw: list[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._raw_escaped = False
+
+    def feed(self, chunk: str) -> list[tuple[str, str, object]]:
+        events: list[tuple[str, str, object]] = []
+        i, n = 0, len(chunk)
+        while i < n:
+            state = self._state
+            if state == _STREAM_STRING:
+                i = self._feed_string(chunk, i, events)
+                continue
+            if state == _RAW_VALUE:
+                i = self._feed_raw(chunk, i, events)
+                continue
+            if state == _KEY:
+                i = self._feed_key(chunk, i)
+                continue
+            char = chunk[i]
+            i += 1
+            if char in _WHITESPACE or state == _END:
+                continue
+            if state == _START:
+                if char == "{":
+                    self._state = _KEY_OR_END
+            elif state in (_KEY_OR_END, _AFTER_VALUE):
+                if char == '"':
+                    self._key_raw, self._raw_escaped = [], False
+                    self._state = _KEY
+                elif char == "}":
+                    self._state = _END
+                    self.done = True
+            elif state == _COLON:
+                if char == ":":
+                    self._state = _VALUE
+            elif state == _VALUE:
+                if char == '"' and self._key in self.stream_keys:
+                    self._text, self._escape, self._high_surrogate = [], "", None
+                    self._state = _STREAM_STRING
+                else:
+                    self._raw, self._depth = [], 0
+                    self._in_string, self._raw_escaped = False, False
+                    self._state = _RAW_VALUE
+                    i -= 1
+        return events
+
+    def _feed_key(self, chunk: str, i: int) -> int:
+        n = len(chunk)
+        while i < n:
+            char = chunk[i]
+            i += 1
+            if self._raw_escaped:
+                self._raw_escaped = False
+            elif char == "\\":
+                self._raw_escaped = True
+            elif char == '"':
+                self._key = json.loads('"' + "".join(self._key_raw) + '"')
+                self._state = _COLON
+                return i
+            self._key_raw.append(char)
+        return i
+
+    def _feed_string(self, chunk: str, i: int, events: list) -> int:
+        n = len(chunk)
+        decoded: list[str] = []
+        while i < n:
+            if self._escape:
+                self._escape += chunk[i]
+                i += 1
+                if text := self._finish_escape():
+                    decoded.append(text)
+                continue
+            match = _STRING_SPECIAL.search(chunk, i)
+            end = match.start() if match else n
+            if end > i:
+                decoded.append(chunk[i:end])
+            i = end
+            if match is None:
+                break
+            i += 1
+            if match.group() == "\\":
+                self._escape = "\\"
+                continue
+            # closing quote
+            if decoded:
+                self._emit_delta("".join(decoded), events)
+            events.append(("value", self._key, "".join(self._text)))
+            self._state = _AFTER_VALUE
+            return i
+        if decoded:
+            self._emit_delta("".join(decoded), events)
+        return i
+
+    def _emit_delta(self, text: str, events: list) -> None:
+        self._text.append(text)
+        events.append(("delta", self._key, text))
+
+    def _finish_escape(self) -> str:
+        """Decode the pending escape once it is complete, otherwise return ''."""
+        escape = self._escape
+        if len(escape) < 2:
+            return ""
+        if escape[1] != "u":
+            self._escape = ""
+            return _ESCAPES.get(escape[1], escape[1])
+        if len(escape) < 6:
+            return ""
+        self._escape = ""
+        code = int(escape[2:], 16)
+        if 0xD800 <= code <= 0xDBFF:
+            # wait for the low half of the surrogate pair
+            self._high_surrogate = escape
+            return ""
+        if self._high_surrogate is not None:
+            pair = self._high_surrogate + escape
+            self._high_surrogate = None
+            return json.loads(f'"{pair}"')
+        return chr(code)
+
+    def _feed_raw(self, chunk: str, i: int, events: list) -> int:
+        n = len(chunk)
+        start = i
+        complete = False
+        while i < n:
+            char = chunk[i]
+            if self._in_string:
+                i += 1
+                if self._raw_escaped:
+                    self._raw_escaped = False
+                elif char == "\\":
+                    self._raw_escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    # a plain string value ends with its closing quote
+                    complete = self._depth == 0
+            elif char == '"':
+                i += 1
+                self._in_string = True
+            elif char in "[{":
+                i += 1
+                self._depth += 1
+            elif char in "]}" and self._depth > 0:
+                i += 1
+                self._depth -= 1
+                complete = self._depth == 0
+            elif char in ",}" and self._depth == 0:
+                # a number, true, false or null ends at the next delimiter
+                complete = True
+            else:
+                i += 1
+            if complete:
+                break
+        self._raw.append(chunk[start:i])
+        if complete:
+            raw = "".join(self._raw).strip()
+            events.append(("value", self._key, json.loads(raw)))
+            self._state = _AFTER_VALUE
+        return i
@@ -0,0 +1,329 @@
+"""Shared session state, so chat history survives restarts and is visible to
+every uvicorn worker.
+
+A session is stored as its list of turns (the messages of one exchange plus
+their token count, so loading never re-tokenizes) and an optional running
+summary. Backends are picked by URL with `open_session_store`:
+
+    sqlite:///sessions.sqlite     one file, WAL mode, shared by local workers
+    redis://localhost:6379/0      any Redis-protocol server
+
+Requests of one session are serialized within a worker; two workers serving
+the same session at once may interleave their turns, but each turn is
+appended atomically.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from urllib.parse import urlparse
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+# a stored turn: its messages and their token count
+Turn = tuple[list[BaseMessage], int]
+
+
+def encode_turn(messages: list[BaseMessage], tokens: int) -> str:
+    return json.dumps({"messages": messages_to_dict(messages), "tokens": tokens})
+
+
+def decode_turn(data: str | bytes) -> Turn:
+    turn = json.loads(data)
+    return messages_from_dict(turn["messages"]), turn["tokens"]
+
+
+class SessionStore(ABC):
+    """Async interface every session backend implements."""
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abstractmethod
+    async def load(self, session_id: str) -> tuple[str | None, list[Turn]]:
+        """Return the session's summary (or None) and its turns, oldest first."""
+
+    @abstractmethod
+    async def append(self, session_id: str, messages: list[BaseMessage], tokens: int) -> None:
+        """Append one turn to the session."""
+
+    @abstractmethod
+    async def set_summary(self, session_id: str, summary: str) -> None:
+        """Replace the session's running summary."""
+
+    @abstractmethod
+    async def clear(self, session_id: str) -> None:
+        """Delete the session's turns and summary."""
+
+    def stats(self) -> dict:
+        return {}
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in one SQLite file in WAL mode, so several worker processes
+    can read while one writes. Queries run in a thread off the event loop."""
+
+    def __init__(self, path: str, max_turns: int = 50, ttl: float = 7 * 24 * 60 * 60):
+        self.path = path
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self.counters = {"loads": 0, "appends": 0, "purged": 0}
+
+    def _connect(self) -> None:
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(session_id TEXT PRIMARY KEY, summary TEXT, updated_at REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS turns "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, turn TEXT NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, id);"
+            )
+            self._conn.commit()
+
+    async def start(self) -> None:
+        await asyncio.to_thread(self._connect)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    def _load(self, session_id: str) -> tuple[str | None, list[str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None or row[1] < time.time() - self.ttl:
+                return None, []
+            turns = self._conn.execute(
+                "SELECT turn FROM turns WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+        return row[0], [turn for (turn,) in turns]
+
+    async def load(self, session_id: str) -> tuple[str | None, list[Turn]]:
+        self.counters["loads"] += 1
+        summary, turns = await asyncio.to_thread(self._load, session_id)
+        return summary, [decode_turn(turn) for turn in turns]
+
+    def _append(self, session_id: str, turn: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (session_id, now),
+            )
+            self._conn.execute("INSERT INTO turns (session_id, turn) VALUES (?, ?)", (session_id, turn))
+            # keep only the newest max_turns turns of the session
+            self._conn.execute(
+                "DELETE FROM turns WHERE session_id = ? AND id <= ("
+                "SELECT id FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (session_id, session_id, self.max_turns),
+            )
+            # sweep expired sessions now and then rather than on every write
+            if self.counters["appends"] % 100 == 0:
+                expired = now - self.ttl
+                self._conn.execute(
+                    "DELETE FROM turns WHERE session_id IN "
+                    "(SELECT session_id FROM sessions WHERE updated_at < ?)",
+                    (expired,),
+                )
+                cursor = self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (expired,))
+                self.counters["purged"] += cursor.rowcount
+
+    async def append(self, session_id: str, messages: list[BaseMessage], tokens: int) -> None:
+        self.counters["appends"] += 1
+        await asyncio.to_thread(self._append, session_id, encode_turn(messages, tokens))
+
+    def _set_summary(self, session_id: str, summary: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sessions (session_id, summary, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET summary = excluded.summary, "
+                "updated_at = excluded.updated_at",
+                (session_id, summary, time.time()),
+            )
+
+    async def set_summary(self, session_id: str, summary: str) -> None:
+        await asyncio.to_thread(self._set_summary, session_id, summary)
+
+    def _clear(self, session_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    async def clear(self, session_id: str) -> None:
+        await asyncio.to_thread(self._clear, session_id)
+
+    def stats(self) -> dict:
+        return {"backend": "sqlite", "path": self.path, **self.counters}
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisConnection:
+    """Minimal RESP2 client: pipelined commands over one asyncio stream."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    @staticmethod
+    def _encode(args: tuple) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            return RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RedisError(f"unexpected reply {line!r}")
+
+    async def execute(self, *commands: tuple) -> list:
+        """Send all commands in one write and read their replies in order."""
+        self.writer.write(b"".join(self._encode(command) for command in commands))
+        await self.writer.drain()
+        replies = [await self._read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    async def close(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class RedisSessionStore(SessionStore):
+    """Sessions in a Redis-protocol server: a list of turns and a summary
+    string per session, both expiring `ttl` seconds after the last write.
+
+    Connections come from a small pool and every operation is a single
+    pipelined round trip.
+    """
+
+    def __init__(self, url: str, max_turns: int = 50, ttl: float = 7 * 24 * 60 * 60, pool_size: int = 10):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = parsed.password
+        self.max_turns = max_turns
+        self.ttl = int(ttl)
+        self.pool_size = pool_size
+        self._idle: list[RedisConnection] = []
+        self._slots = asyncio.Semaphore(pool_size)
+        self.counters = {"loads": 0, "appends": 0, "connections": 0}
+
+    async def _connect(self) -> RedisConnection:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        conn = RedisConnection(reader, writer)
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            await conn.execute(*setup)
+        self.counters["connections"] += 1
+        return conn
+
+    async def _execute(self, *commands: tuple) -> list:
+        async with self._slots:
+            conn = self._idle.pop() if self._idle else await self._connect()
+            try:
+                replies = await conn.execute(*commands)
+            except BaseException:
+                # the reply stream may be out of step, never reuse the connection
+                await conn.close()
+                raise
+            self._idle.append(conn)
+            return replies
+
+    async def close(self) -> None:
+        while self._idle:
+            await self._idle.pop().close()
+
+    @staticmethod
+    def _keys(session_id: str) -> tuple[str, str]:
+        return f"session:{session_id}:turns", f"session:{session_id}:summary"
+
+    async def load(self, session_id: str) -> tuple[str | None, list[Turn]]:
+        self.counters["loads"] += 1
+        turns_key, summary_key = self._keys(session_id)
+        turns, summary = await self._execute(("LRANGE", turns_key, 0, -1), ("GET", summary_key))
+        return (summary.decode() if summary is not None else None), [decode_turn(turn) for turn in turns]
+
+    async def append(self, session_id: str, messages: list[BaseMessage], tokens: int) -> None:
+        self.counters["appends"] += 1
+        turns_key, summary_key = self._keys(session_id)
+        await self._execute(
+            ("RPUSH", turns_key, encode_turn(messages, tokens)),
+            ("LTRIM", turns_key, -self.max_turns, -1),
+            ("EXPIRE", turns_key, self.ttl),
+            ("EXPIRE", summary_key, self.ttl),
+        )
+
+    async def set_summary(self, session_id: str, summary: str) -> None:
+        _, summary_key = self._keys(session_id)
+        await self._execute(("SET", summary_key, summary, "EX", self.ttl))
+
+    async def clear(self, session_id: str) -> None:
+        await self._execute(("DEL", *self._keys(session_id)))
+
+    def stats(self) -> dict:
+        return {
+            "backend": "redis",
+            "address": f"{self.host}:{self.port}/{self.db}",
+            "pool_idle": len(self._idle),
+            **self.counters,
+        }
+
+
+def open_session_store(url: str, **kwargs) -> SessionStore | None:
+    """Session store for `url`, or None to keep history in process memory."""
+    if not url or url == "memory":
+        return None
+    scheme = urlparse(url).scheme
+    if scheme == "sqlite":
+        return SQLiteSessionStore(url.removeprefix("sqlite:///"), **kwargs)
+    if scheme == "redis":
+        return RedisSessionStore(url, **kwargs)
+    raise ValueError(f"unsupported session backend: {url}")
@@ -0,0 +1,68 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class SessionRegistry(Generic[T]):
+    """Per-session objects (agent executors) with LRU and idle-TTL eviction.
+
+    At most `max_sessions` entries are kept; the least recently used one is
+    dropped when a new session arrives at capacity, and any session idle for
+    longer than `ttl` seconds is dropped on the next lookup.
+    """
+
+    def __init__(self, factory: Callable[[str], T], max_sessions: int = 1000, ttl: float = 30 * 60):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: OrderedDict[str, tuple[T, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def _expire(self, now: float) -> None:
+        # entries are kept in last-used order so expired ones sit at the front
+        while self._sessions:
+            session_id, (_, last_used) = next(iter(self._sessions.items()))
+            if now - last_used < self.ttl:
+                break
+            del self._sessions[session_id]
+            self.expirations += 1
+
+    def get(self, session_id: str) -> T:
+        """Return the object for `session_id`, creating it if needed."""
+        now = time.monotonic()
+        self._expire(now)
+        if session_id in self._sessions:
+            self.hits += 1
+            value, _ = self._sessions.pop(session_id)
+        else:
+            self.misses += 1
+            value = self.factory(session_id)
+            while len(self._sessions) >= self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        self._sessions[session_id] = (value, now)
+        return value
+
+    def discard(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
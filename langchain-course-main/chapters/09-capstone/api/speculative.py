@@ -0,0 +1,109 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable
+
+from langchain_core.messages import ToolCall, ToolMessage
+
+# tools that gain nothing from starting early
+NON_SPECULATIVE_TOOLS = {"final_answer"}
+
+# process-wide counters, reported by the API
+speculation_stats = {
+    "steps": 0,
+    "tools_started": 0,
+    "tools_used": 0,
+    "tools_discarded": 0,
+    "time_saved": 0.0,
+}
+
+
+class SpeculativeToolRunner:
+    """Starts tool calls while the LLM is still streaming the rest of its message.
+
+    Tool-call chunks are fed in as they arrive and the argument fragments are
+    accumulated per call. As soon as a call's arguments parse as a complete
+    JSON object the tool is started. Once the stream has finished, `resolve`
+    returns the running task for each final call whose name and arguments
+    match what was started, and cancels everything else.
+    """
+
+    def __init__(self, run: Callable[[ToolCall], Awaitable[ToolMessage]]):
+        self._run = run
+        self._partial: dict[int, dict] = {}
+        self._started: dict[str, tuple[ToolCall, asyncio.Task]] = {}
+        self._timings: dict[str, list[float]] = {}
+        self.time_saved = 0.0
+
+    def feed(self, chunks: list[dict]) -> None:
+        """Accumulate tool call chunks (`AIMessageChunk.tool_call_chunks`)."""
+        for chunk in chunks:
+            call = self._partial.setdefault(chunk.get("index") or 0, {"id": None, "name": None, "args": ""})
+            if chunk.get("id"):
+                call["id"] = chunk["id"]
+            if chunk.get("name"):
+                call["name"] = chunk["name"]
+            if chunk.get("args"):
+                call["args"] += chunk["args"]
+                # only try to parse once the object could have been closed
+                if call["args"].rstrip().endswith("}"):
+                    self._maybe_start(call)
+
+    def _maybe_start(self, call: dict) -> None:
+        if call["id"] is None or call["id"] in self._started:
+            return
+        if call["name"] is None or call["name"] in NON_SPECULATIVE_TOOLS:
+            return
+        try:
+            args = json.loads(call["args"])
+        except ValueError:
+            return
+        if not isinstance(args, dict):
+            return
+        tool_call = ToolCall(name=call["name"], args=args, id=call["id"])
+        timing = self._timings[call["id"]] = [time.perf_counter()]
+        task = asyncio.create_task(self._run(tool_call))
+        task.add_done_callback(lambda _: timing.append(time.perf_counter()))
+        self._started[call["id"]] = (tool_call, task)
+        speculation_stats["tools_started"] += 1
+
+    def resolve(self, tool_calls: list[ToolCall]) -> dict[str, asyncio.Task]:
+        """Match the final tool calls against the started ones.
+
+        Tasks whose call was confirmed are returned keyed by call id, the
+        rest are cancelled and their results discarded.
+        """
+        confirmed = {}
+        for call in tool_calls:
+            started = self._started.get(call["id"])
+            if started is None:
+                continue
+            started_call, task = started
+            if started_call["name"] == call["name"] and started_call["args"] == call["args"]:
+                confirmed[call["id"]] = task
+        for call_id, (_, task) in self._started.items():
+            if call_id not in confirmed:
+                task.cancel()
+                speculation_stats["tools_discarded"] += 1
+        speculation_stats["tools_used"] += len(confirmed)
+        return confirmed
+
+    def record_step(self, stream_end: float, tools_end: float, durations: dict[str, float]) -> float:
+        """Estimate the wall-clock time this step saved by starting tools early.
+
+        Without speculation every tool would start when the stream ended, so
+        the step would take as long as its slowest tool; the saving is that
+        minus the time actually spent waiting for tools after the stream.
+        """
+        for call_id, timing in self._timings.items():
+            if call_id in durations and len(timing) == 2:
+                durations[call_id] = timing[1] - timing[0]
+        baseline = max(durations.values(), default=0.0)
+        self.time_saved = max(0.0, baseline - (tools_end - stream_end))
+        speculation_stats["steps"] += 1
+        speculation_stats["time_saved"] += self.time_saved
+        return self.time_saved
+
+    def cancel(self) -> None:
+        for _, task in self._started.values():
+            task.cancel()
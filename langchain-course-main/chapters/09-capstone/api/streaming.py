@@ -0,0 +1,250 @@
+import asyncio
+import json
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+# Sentinels passed from the callback handler (producer) to the response
+# generator (consumer)
+DONE = "<<DONE>>"
+STEP_END = "<<STEP_END>>"
+# yielded by `SSEFramer.paced` when buffered fragments are due to be sent
+FLUSH = "<<FLUSH>>"
+
+
+@dataclass
+class StreamStats:
+    """Timing for a single response stream, measured where the tokens are consumed."""
+    started_at: float = field(default_factory=time.perf_counter)
+    first_token_at: float | None = None
+    last_token_at: float | None = None
+    tokens: int = 0
+    gap_total: float = 0.0
+    gap_max: float = 0.0
+    # number of times the producer found the buffer full and had to wait
+    producer_waits: int = 0
+    # SSE frames and bytes written to the client
+    frames: int = 0
+    bytes: int = 0
+
+    def record_token(self) -> float | None:
+        """Mark a token as delivered, returning the gap since the previous one."""
+        now = time.perf_counter()
+        gap = None
+        if self.first_token_at is None:
+            self.first_token_at = now
+        else:
+            gap = now - self.last_token_at
+            self.gap_total += gap
+            self.gap_max = max(self.gap_max, gap)
+        self.last_token_at = now
+        self.tokens += 1
+        return gap
+
+    @property
+    def ttfb(self) -> float | None:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def mean_gap(self) -> float | None:
+        if self.tokens < 2:
+            return None
+        return self.gap_total / (self.tokens - 1)
+
+    def as_dict(self) -> dict:
+        return {
+            "ttfb": self.ttfb,
+            "tokens": self.tokens,
+            "mean_gap": self.mean_gap,
+            "max_gap": self.gap_max,
+            "producer_waits": self.producer_waits,
+            "frames": self.frames,
+            "bytes": self.bytes,
+        }
+
+
+def percentiles(values: list[float]) -> dict[str, float | None]:
+    """p50/p95/p99 of a sample, None when the sample is empty."""
+    values = sorted(values)
+    return {
+        name: values[min(len(values) - 1, int(q * len(values)))] if values else None
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+    }
+
+
+class StreamMetrics:
+    """Process-wide view of recent streams, kept in fixed-size reservoirs."""
+
+    def __init__(self, window: int = 2048):
+        self.streams = 0
+        self.active = 0
+        self.tokens = 0
+        self.producer_waits = 0
+        self.frames = 0
+        self.bytes = 0
+        self._ttfb: deque[float] = deque(maxlen=window)
+        self._gaps: deque[float] = deque(maxlen=window)
+
+    def stream_started(self) -> None:
+        self.active += 1
+
+    def observe_gap(self, gap: float) -> None:
+        self._gaps.append(gap)
+
+    def frame_sent(self, size: int) -> None:
+        self.frames += 1
+        self.bytes += size
+
+    def stream_finished(self, stats: StreamStats) -> None:
+        self.active -= 1
+        self.streams += 1
+        self.tokens += stats.tokens
+        self.producer_waits += stats.producer_waits
+        if stats.ttfb is not None:
+            self._ttfb.append(stats.ttfb)
+
+    def snapshot(self) -> dict:
+        return {
+            "streams": self.streams,
+            "active": self.active,
+            "tokens": self.tokens,
+            "producer_waits": self.producer_waits,
+            "frames_per_stream": self.frames / self.streams if self.streams else None,
+            "bytes_per_stream": self.bytes / self.streams if self.streams else None,
+            "ttfb": percentiles(list(self._ttfb)),
+            "inter_token_gap": percentiles(list(self._gaps)),
+        }
+
+
+stream_metrics = StreamMetrics()
+
+
+class StreamChannel:
+    """Bounded hand-off between the LLM callbacks and the HTTP response.
+
+    The consumer awaits the producer directly instead of polling, and
+    `put` blocks once `maxsize` items are buffered so a slow client
+    applies backpressure to the LLM stream rather than growing memory.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._closed = False
+        self.stats = StreamStats()
+
+    async def put(self, item) -> None:
+        if self._queue.full():
+            self.stats.producer_waits += 1
+        await self._queue.put(item)
+
+    async def get(self):
+        return await self._queue.get()
+
+    def close(self) -> None:
+        """End the stream once buffered items are consumed, even without a `DONE`."""
+        self._closed = True
+        if not self._queue.full():
+            # wakes a consumer blocked on an empty queue
+            self._queue.put_nowait(DONE)
+
+    async def __aiter__(self):
+        stream_metrics.stream_started()
+        try:
+            while not (self._closed and self._queue.empty()):
+                item = await self._queue.get()
+                if item == DONE:
+                    return
+                if not item:
+                    continue
+                if item != STEP_END:
+                    gap = self.stats.record_token()
+                    if gap is not None:
+                        stream_metrics.observe_gap(gap)
+                yield item
+        finally:
+            stream_metrics.stream_finished(self.stats)
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode a single server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class SSEFramer:
+    """Typed SSE frames for one response, with coalescing of text deltas.
+
+    Delta events (`args_delta`, `answer_delta`) are buffered for up to
+    `window` seconds and sent as one frame, so a tool call streamed as
+    hundreds of tiny chunks goes out as a handful of writes. Any other
+    event, or a delta of a different type, flushes the buffer first,
+    keeping frames in order. A `window` of 0 disables coalescing.
+    """
+
+    def __init__(self, stats: StreamStats, window: float = 0.01):
+        self.stats = stats
+        self.window = window
+        self._pending: list[str] = []
+        self._pending_event = ""
+        self._pending_since = 0.0
+
+    def _frame(self, event: str, data: dict) -> str:
+        frame = format_sse(event, data)
+        size = len(frame.encode())
+        self.stats.frames += 1
+        self.stats.bytes += size
+        stream_metrics.frame_sent(size)
+        return frame
+
+    def flush(self) -> str:
+        """Frame for any buffered deltas, or an empty string."""
+        if not self._pending:
+            return ""
+        delta = "".join(self._pending)
+        self._pending.clear()
+        return self._frame(self._pending_event, {"delta": delta})
+
+    def event(self, event: str, data: dict) -> str:
+        return self.flush() + self._frame(event, data)
+
+    def delta(self, event: str, delta: str) -> str:
+        """Buffer a text delta, returning any frames that are due."""
+        frames = self.flush() if event != self._pending_event else ""
+        if not self._pending:
+            self._pending_event = event
+            self._pending_since = time.perf_counter()
+        self._pending.append(delta)
+        if time.perf_counter() - self._pending_since >= self.window:
+            frames += self.flush()
+        return frames
+
+    def timeout(self) -> float | None:
+        """Seconds until the buffered fragments are due, None if nothing is buffered."""
+        if not self._pending:
+            return None
+        return max(0.0, self.window - (time.perf_counter() - self._pending_since))
+
+    async def paced(self, tokens: AsyncIterator):
+        """Yield from `tokens`, yielding `FLUSH` whenever buffered fragments fall due.
+
+        The pending read is never cancelled on a timeout, only waited on
+        again, so no token is lost between flushes.
+        """
+        iterator = tokens.__aiter__()
+        next_token = asyncio.ensure_future(iterator.__anext__())
+        try:
+            while True:
+                done, _ = await asyncio.wait({next_token}, timeout=self.timeout())
+                if not done:
+                    yield FLUSH
+                    continue
+                try:
+                    token = next_token.result()
+                except StopAsyncIteration:
+                    return
+                next_token = asyncio.ensure_future(iterator.__anext__())
+                yield token
+        finally:
+            next_token.cancel()
@@ -1,7 +1,6 @@
 "use client";
 
 import { useEffect, useRef, useState } from "react";
-import { IncompleteJsonParser } from "incomplete-json-parser";
 import { ChatOutput } from "@/types";
 
 const TextArea = ({
@@ -15,10 +14,9 @@ const TextArea = ({
   setOutputs: React.Dispatch<React.SetStateAction<ChatOutput[]>>;
   outputs: ChatOutput[];
 }) => {
-  // Parser instance to handle incomplete JSON streaming responses
-  const parser = new IncompleteJsonParser();
-
   const [text, setText] = useState("");
+  // Session id issued by the api on the first request, reused so it keeps our chat history
+  const sessionId = useRef<string | null>(null);
   const textAreaRef = useRef<HTMLTextAreaElement>(null);
 
   // Handles form submission
@@ -46,7 +44,9 @@ const TextArea = ({
     setIsGenerating(true);
 
     try {
-      const res = await fetch(`http://localhost:8000/invoke?content=${text}`, {
+      const params = new URLSearchParams({ content: text });
+      if (sessionId.current) params.set("session_id", sessionId.current);
+      const res = await fetch(`http://localhost:8000/invoke?${params}`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -57,6 +57,7 @@ const TextArea = ({
       if (!res.ok) {
         throw new Error("Error");
       }
+      sessionId.current = res.headers.get("X-Session-ID") ?? sessionId.current;
 
       const data = res.body;
       if (!data) {
@@ -67,58 +68,69 @@ const TextArea = ({
       const reader = data.getReader();
       const decoder = new TextDecoder();
       let done = false;
-      let answer = { answer: "", tools_used: [] };
+      let answer: ChatOutput["result"] = { answer: "", tools_used: [] };
       let currentSteps: { name: string; result: Record<string, string> }[] = [];
+      // raw JSON arguments of the tool call currently being streamed
+      let currentStep: { name: string; args: string } | null = null;
       let buffer = "";
 
-      // Process streaming response chunks and parse steps/results
+      // Record a completed tool call as a step (the final answer is shown separately)
+      const finishStep = () => {
+        if (currentStep && currentStep.name !== "final_answer") {
+          try {
+            currentSteps.push({
+              name: currentStep.name,
+              result: JSON.parse(currentStep.args),
+            });
+          } catch (e) {
+            console.log("Failed to parse step:", e);
+          }
+        }
+        currentStep = null;
+      };
+
+      // Handle one server-sent event: regular steps and the final answer
+      const handleEvent = (event: string, data: any) => {
+        if (event === "step_start") {
+          // parallel tool calls start one after another within a single step
+          finishStep();
+          currentStep = { name: data.name, args: "" };
+        } else if (event === "args_delta" && currentStep) {
+          currentStep.args += data.delta;
+        } else if (event === "answer_delta") {
+          // the api already extracts the answer text from the final_answer JSON
+          answer = { ...answer, answer: answer.answer + data.delta };
+        } else if (event === "tools_used") {
+          answer = { ...answer, tools_used: data.tools_used };
+        } else if (event === "step_end") {
+          finishStep();
+        } else if (event === "final") {
+          answer = data;
+        }
+      };
+
+      // Process streaming response chunks, events are separated by a blank line
       while (!done) {
         const { value, done: doneReading } = await reader.read();
         done = doneReading;
-        let chunkValue = decoder.decode(value);
-        // console.log(`chunk: ${chunkValue}`);
+        let chunkValue = decoder.decode(value, { stream: !done });
         if (!chunkValue) continue;
 
         buffer += chunkValue;
-
-        // Handle different types of steps in the response stream - regular steps and final answer
-        if (buffer.includes("</step_name>")) {
-          const stepNameMatch = buffer.match(/<step_name>([^<]*)<\/step_name>/);
-          if (stepNameMatch) {
-            const [_, stepName] = stepNameMatch;
-            try {
-              if (stepName !== "final_answer") {
-                const fullStepPattern =
-                  /<step><step_name>([^<]*)<\/step_name>([^<]*?)(?=<step>|<\/step>|$)/g;
-                const matches = [...buffer.matchAll(fullStepPattern)];
-
-                for (const match of matches) {
-                  const [fullMatch, matchStepName, jsonStr] = match;
-                  if (jsonStr) {
-                    try {
-                      const result = JSON.parse(jsonStr);
-                      currentSteps.push({ name: matchStepName, result });
-                      buffer = buffer.replace(fullMatch, "");
-                    } catch (error) {
-                    }
-                  }
-                }
-              } else {
-                // If it's the final answer step, parse the streaming JSON using incomplete-json-parser
-                const jsonMatch = buffer.match(
-                  /(?<=<step><step_name>final_answer<\/step_name>)(.*)/
-                );
-                if (jsonMatch) {
-                  const [_, jsonStr] = jsonMatch;
-                  parser.write(jsonStr);
-                  const result = parser.getObjects();
-                  answer = result;
-                  parser.reset();
-                }
-              }
-            } catch (e) {
-              console.log("Failed to parse step:", e);
-            }
+        const frames = buffer.split("\n\n");
+        buffer = frames.pop() ?? "";
+
+        for (const frame of frames) {
+          let event = "message";
+          let data = "";
+          for (const line of frame.split("\n")) {
+            if (line.startsWith("event: ")) event = line.slice(7);
+            else if (line.startsWith("data: ")) data += line.slice(6);
+          }
+          try {
+            handleEvent(event, JSON.parse(data));
+          } catch (e) {
+            console.log("Failed to parse event:", e);
           }
         }
 
@@ -129,7 +141,7 @@ const TextArea = ({
             ...prevState.slice(0, -1),
             {
               ...lastOutput,
-              steps: currentSteps,
+              steps: [...currentSteps],
               result: answer,
             },
           ];
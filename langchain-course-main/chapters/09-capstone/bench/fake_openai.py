@@ -0,0 +1,214 @@
+"""Local stand-in for the OpenAI chat-completions streaming API (and serpapi).
+
+The agent is driven by a tool-call script: step N of a conversation
+streams the tool calls listed at index N of the script. The step is found
+by counting the tool calls made since the last user message against the
+script, so it does not matter whether the agent sends parallel calls as
+one assistant message or one message per call. Tokens are emitted
+at `--tokens-per-second` with `--jitter` relative noise on each gap.
+
+    python fake_openai.py --port 8001 --tokens-per-second 80 --script add
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from aiohttp import web
+
+# built-in scripts, each step is the list of tool calls made in that step
+SCRIPTS = {
+    "add": [
+        [{"name": "add", "args": {"x": 5, "y": 5}}],
+        [{"name": "final_answer", "args": {"answer": "5 + 5 is 10.", "tools_used": ["add"]}}],
+    ],
+    "parallel": [
+        [
+            {"name": "serpapi", "args": {"query": "weather in oslo"}},
+            {"name": "multiply", "args": {"x": 5, "y": 5}},
+        ],
+        [{"name": "multiply", "args": {"x": 25, "y": -3}}],
+        [{
+            "name": "final_answer",
+            "args": {
+                "answer": "It is -3 degrees in Oslo, 5 * 5 is 25 and multiplying the two gives -75.",
+                "tools_used": ["serpapi", "multiply"],
+            },
+        }],
+    ],
+    "search": [
+        [{"name": "serpapi", "args": {"query": "latest world news"}}],
+        [{
+            "name": "final_answer",
+            "args": {
+                "answer": "Here is a summary of the latest news. " * 20,
+                "tools_used": ["serpapi"],
+            },
+        }],
+    ],
+}
+
+
+def fragments(text: str, size: int = 4) -> list[str]:
+    """Split text into token-sized pieces (~4 characters per token)."""
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def current_step(messages: list[dict], script: list) -> int:
+    calls = 0
+    for message in reversed(messages):
+        if message["role"] == "user":
+            break
+        if message["role"] == "assistant":
+            calls += len(message.get("tool_calls") or [])
+    # each step uses up as many calls as it made
+    step = 0
+    while step < len(script) - 1 and calls >= len(script[step]):
+        calls -= len(script[step])
+        step += 1
+    return step
+
+
+def served_steps(script: list) -> list[int]:
+    """Steps served to an agent that runs every call it is given, recording
+    one assistant message and one tool result per call as the agent does."""
+    messages = [{"role": "user", "content": "benchmark"}]
+    steps = []
+    while len(steps) < len(script):
+        step = current_step(messages, script)
+        steps.append(step)
+        if step == len(script) - 1:
+            break
+        for call in script[step]:
+            call_id = f"call_{len(messages)}"
+            messages.append({
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": call_id,
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call["args"])},
+                }],
+            })
+            messages.append({"role": "tool", "tool_call_id": call_id, "content": "ok"})
+    return steps
+
+
+def check_script(script: list) -> None:
+    """Raise ValueError unless every step of the script is played in order."""
+    if not script or not all(script):
+        raise ValueError("every step of a script needs at least one tool call")
+    steps = served_steps(script)
+    if steps != list(range(len(script))):
+        raise ValueError(f"script plays steps {steps}, expected 0..{len(script) - 1}")
+
+
+class FakeOpenAI:
+    def __init__(self, script: list, tokens_per_second: float, jitter: float, first_token_delay: float, search_delay: float):
+        self.script = script
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.first_token_delay = first_token_delay
+        self.search_delay = search_delay
+        self.requests = 0
+
+    async def _sleep_gap(self) -> None:
+        gap = 1 / self.tokens_per_second
+        await asyncio.sleep(max(0.0, gap * (1 + random.uniform(-self.jitter, self.jitter))))
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.requests += 1
+        step = current_step(body["messages"], self.script)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(delta: dict, finish_reason: str | None = None) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        await asyncio.sleep(self.first_token_delay)
+        for index, call in enumerate(self.script[step]):
+            await send({
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "index": index,
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": ""},
+                }],
+            })
+            for fragment in fragments(json.dumps(call["args"])):
+                await self._sleep_gap()
+                await send({"tool_calls": [{"index": index, "function": {"arguments": fragment}}]})
+        await send({}, finish_reason="tool_calls")
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def search(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.search_delay)
+        query = request.query.get("q", "")
+        return web.json_response({
+            "organic_results": [
+                {
+                    "title": f"Result {i} for {query}",
+                    "source": "example.com",
+                    "link": f"https://example.com/{i}",
+                    "snippet": f"Snippet {i} about {query}.",
+                }
+                for i in range(5)
+            ]
+        })
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"requests": self.requests})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_get("/search", self.search)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative noise on each token gap (0-1)")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="seconds before the first chunk")
+    parser.add_argument("--search-delay", type=float, default=0.2, help="seconds per fake serpapi call")
+    parser.add_argument("--script", default="add", help=f"built-in script ({', '.join(SCRIPTS)}) or a JSON file")
+    args = parser.parse_args()
+
+    if args.script in SCRIPTS:
+        script = SCRIPTS[args.script]
+    else:
+        with open(args.script) as f:
+            script = json.load(f)
+    for builtin in SCRIPTS.values():
+        check_script(builtin)
+    try:
+        check_script(script)
+    except ValueError as e:
+        parser.error(f"--script {args.script}: {e}")
+
+    fake = FakeOpenAI(script, args.tokens_per_second, args.jitter, args.first_token_delay, args.search_delay)
+    web.run_app(fake.app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Local stand-in for a Redis server, enough for the API's session store.
+
+Speaks RESP2 and implements PING, AUTH, SELECT, GET, SET (with EX), DEL,
+RPUSH, LRANGE, LTRIM and EXPIRE on in-memory strings and lists, with lazy
+key expiry. Data is lost when the process exits.
+
+    python fake_redis.py --port 6379
+"""
+import argparse
+import asyncio
+import time
+
+
+def encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(item) for item in value)
+    if isinstance(value, Exception):
+        return f"-ERR {value}\r\n".encode()
+    return f"+{value}\r\n".encode()
+
+
+def list_range(items: list, start: int, stop: int) -> slice:
+    """Redis' inclusive, negative-aware start/stop as a Python slice."""
+    n = len(items)
+    start = max(n + start, 0) if start < 0 else start
+    stop = n + stop if stop < 0 else stop
+    return slice(start, stop + 1) if stop >= start else slice(0, 0)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data: dict[bytes, bytes | list[bytes]] = {}
+        self.expires: dict[bytes, float] = {}
+        self.commands = 0
+
+    def _get(self, key: bytes):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            del self.expires[key]
+        return self.data.get(key)
+
+    def execute(self, name: str, args: list[bytes]):
+        self.commands += 1
+        if name == "PING":
+            return "PONG"
+        if name in ("AUTH", "SELECT"):
+            return "OK"
+        if name == "GET":
+            return self._get(args[0])
+        if name == "SET":
+            self.data[args[0]] = args[1]
+            self.expires.pop(args[0], None)
+            if len(args) >= 4 and args[2].upper() == b"EX":
+                self.expires[args[0]] = time.monotonic() + int(args[3])
+            return "OK"
+        if name == "DEL":
+            deleted = 0
+            for key in args:
+                if self._get(key) is not None:
+                    deleted += 1
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return deleted
+        if name == "RPUSH":
+            items = self._get(args[0])
+            if items is None:
+                items = self.data[args[0]] = []
+            items.extend(args[1:])
+            return len(items)
+        if name == "LRANGE":
+            items = self._get(args[0]) or []
+            return items[list_range(items, int(args[1]), int(args[2]))]
+        if name == "LTRIM":
+            items = self._get(args[0])
+            if items is not None:
+                items[:] = items[list_range(items, int(args[1]), int(args[2]))]
+            return "OK"
+        if name == "EXPIRE":
+            if self._get(args[0]) is None:
+                return 0
+            self.expires[args[0]] = time.monotonic() + int(args[1])
+            return 1
+        return ValueError(f"unknown command '{name}'")
+
+    async def read_command(self, reader: asyncio.StreamReader) -> list[bytes] | None:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # inline command, as sent by `redis-cli` or telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while (args := await self.read_command(reader)) is not None:
+                if args:
+                    writer.write(encode(self.execute(args[0].decode().upper(), args[1:])))
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host: str, port: int) -> None:
+    fake = FakeRedis()
+    server = await asyncio.start_server(fake.handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
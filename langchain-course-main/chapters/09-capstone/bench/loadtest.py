@@ -0,0 +1,253 @@
+"""Offline load test for the capstone API.
+
+Starts `fake_openai.py` and `api/main.py` (under uvicorn, pointed at the
+fake through OPENAI_BASE_URL and SERPAPI_URL), then drives `/invoke` with
+`--concurrency` clients until `--requests` have completed. Reports
+throughput, p50/p95/p99 time to first byte and total latency, and the API
+process's CPU and RSS (read from /proc, so Linux only).
+
+With `--workers` above 1 the API needs shared session state: pick
+`--session-backend sqlite` (a temporary file) or `redis` (starts
+`fake_redis.py`). CPU and RSS are then summed over the worker processes.
+
+    python loadtest.py --concurrency 200 --requests 2000 --tokens-per-second 80
+    python loadtest.py --workers 4 --session-backend redis
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+
+BENCH_DIR = Path(__file__).resolve().parent
+API_DIR = BENCH_DIR.parent / "api"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+QUESTIONS = [
+    "what is 5+5",
+    "how cold is it in oslo right now, what is 5*5, and what do you get when multiplying those two numbers together?",
+    "tell me about the latest news in the world",
+]
+
+
+def percentiles(values: list[float]) -> dict[str, float | None]:
+    values = sorted(values)
+    return {
+        name: values[min(len(values) - 1, int(q * len(values)))] if values else None
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+    }
+
+
+def process_tree(pid: int) -> list[int]:
+    """`pid` and its children (uvicorn workers run as child processes)."""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    return pids
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of a process and its children from /proc at a
+    fixed interval."""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.cpu_percent: list[float] = []
+        self.rss_mb: list[float] = []
+
+    def _cpu_seconds(self) -> float:
+        total = 0
+        for pid in process_tree(self.pid):
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            # utime and stime are fields 14 and 15, i.e. 11 and 12 after the command name
+            total += int(fields[11]) + int(fields[12])
+        return total / CLOCK_TICKS
+
+    def _rss_mb(self) -> float:
+        total = 0
+        for pid in process_tree(self.pid):
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total += int(line.split()[1])
+            except OSError:
+                continue
+        return total / 1024
+
+    async def run(self) -> None:
+        last_cpu, last_time = self._cpu_seconds(), time.perf_counter()
+        while True:
+            await asyncio.sleep(self.interval)
+            cpu, now = self._cpu_seconds(), time.perf_counter()
+            self.cpu_percent.append(100 * (cpu - last_cpu) / (now - last_time))
+            self.rss_mb.append(self._rss_mb())
+            last_cpu, last_time = cpu, now
+
+    def summary(self) -> dict:
+        return {
+            "cpu_percent_mean": sum(self.cpu_percent) / len(self.cpu_percent) if self.cpu_percent else None,
+            "cpu_percent_max": max(self.cpu_percent, default=None),
+            "rss_mb_start": self.rss_mb[0] if self.rss_mb else None,
+            "rss_mb_max": max(self.rss_mb, default=None),
+        }
+
+
+async def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up within {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+async def client(session: aiohttp.ClientSession, base_url: str, remaining: list[int], results: dict) -> None:
+    session_id = os.urandom(8).hex()
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        question = QUESTIONS[remaining[0] % len(QUESTIONS)]
+        started = time.perf_counter()
+        ttfb = None
+        try:
+            async with session.post(
+                f"{base_url}/invoke", params={"content": question, "session_id": session_id}
+            ) as response:
+                if response.status != 200:
+                    results["rejected"] += 1
+                    if retry_after := response.headers.get("Retry-After"):
+                        await asyncio.sleep(min(float(retry_after), 1.0))
+                    continue
+                async for chunk in response.content.iter_any():
+                    if ttfb is None and chunk:
+                        ttfb = time.perf_counter() - started
+        except aiohttp.ClientError:
+            results["errors"] += 1
+            continue
+        results["ttfb"].append(ttfb)
+        results["latency"].append(time.perf_counter() - started)
+
+
+async def run_load(base_url: str, concurrency: int, requests: int, pid: int) -> dict:
+    results = {"ttfb": [], "latency": [], "rejected": 0, "errors": 0}
+    remaining = [requests]
+    sampler = ProcessSampler(pid)
+    sampling = asyncio.create_task(sampler.run())
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=300)
+    started = time.perf_counter()
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*[client(session, base_url, remaining, results) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        async with session.get(f"{base_url}/stats") as response:
+            server_stats = await response.json()
+    sampling.cancel()
+    completed = len(results["latency"])
+    return {
+        "completed": completed,
+        "rejected": results["rejected"],
+        "errors": results["errors"],
+        "elapsed": elapsed,
+        "throughput_rps": completed / elapsed if elapsed else None,
+        "ttfb": percentiles([t for t in results["ttfb"] if t is not None]),
+        "latency": percentiles(results["latency"]),
+        "server_process": sampler.summary(),
+        "server_stats": server_stats,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--api-port", type=int, default=8000)
+    parser.add_argument("--fake-port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the API")
+    parser.add_argument("--session-backend", choices=("memory", "sqlite", "redis"), default="memory")
+    parser.add_argument("--redis-port", type=int, default=6390)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--search-delay", type=float, default=0.2)
+    parser.add_argument("--script", default="add", help="fake_openai.py script name or JSON file")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-fake",
+        "SERPAPI_API_KEY": "fake",
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "SERPAPI_URL": f"{fake_url}/search",
+    }
+    helpers = []
+    if args.session_backend == "sqlite":
+        env["SESSION_BACKEND"] = f"sqlite:///{tempfile.mkdtemp()}/sessions.sqlite"
+    elif args.session_backend == "redis":
+        env["SESSION_BACKEND"] = f"redis://127.0.0.1:{args.redis_port}/0"
+        helpers.append(subprocess.Popen([
+            sys.executable, str(BENCH_DIR / "fake_redis.py"), "--port", str(args.redis_port),
+        ]))
+    fake = subprocess.Popen([
+        sys.executable, str(BENCH_DIR / "fake_openai.py"),
+        "--port", str(args.fake_port),
+        "--tokens-per-second", str(args.tokens_per_second),
+        "--jitter", str(args.jitter),
+        "--first-token-delay", str(args.first_token_delay),
+        "--search-delay", str(args.search_delay),
+        "--script", args.script,
+    ])
+    api = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ],
+        cwd=API_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        asyncio.run(wait_until_up(f"{fake_url}/stats"))
+        asyncio.run(wait_until_up(f"{api_url}/stats"))
+        report = asyncio.run(run_load(api_url, args.concurrency, args.requests, api.pid))
+    finally:
+        for process in (api, fake, *helpers):
+            process.send_signal(signal.SIGINT)
+        for process in (api, fake, *helpers):
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    report["config"] = vars(args)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
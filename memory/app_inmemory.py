@@ -1,3 +1,7 @@
+from collections import deque
+from functools import lru_cache
+from typing import Callable
+
 from pydantic import BaseModel, Field
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.messages import BaseMessage
@@ -12,6 +16,7 @@ from langchain.prompts import (
     MessagesPlaceholder,
     ChatPromptTemplate,
 )
+from session_registry import SessionRegistry
 
 llm = ChatOllama(model="mistral", base_url="http://localhost:11434")
 system_prompt = "You are a helpful assistant called Zeta."
@@ -39,14 +44,74 @@ class BufferWindowMessageHistory(BaseChatMessageHistory, BaseModel):
         the last `k` messages.
         """
         self.messages.extend(messages)
-        self.messages = self.messages[-self.k :]
+        # trim in place rather than copying the whole list on every add
+        del self.messages[: -self.k]
 
     def clear(self) -> None:
         """Clear the history."""
         self.messages = []
 
 
-chat_map = {}
+@lru_cache(maxsize=None)
+def _cl100k():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def mistral_tokens(text: str) -> int:
+    """Token estimate for budgeting history sent to the local Mistral model.
+
+    Ollama does not expose Mistral's tokenizer, so this uses tiktoken's
+    cl100k_base when it is installed (a different vocabulary, but close on
+    English chat text) and len / 4 otherwise.
+    """
+    encoding = _cl100k()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class TokenWindowMessageHistory(BaseChatMessageHistory):
+    """Window of the most recent messages that fit in `max_tokens`.
+
+    Each message's token count is computed once when it is added and kept
+    next to it in a deque, with a running total, so trimming pops from the
+    left without re-tokenizing: amortized O(1) per message. The budget is
+    strict, a single message larger than it is dropped as well, so the
+    history part of the prompt never exceeds `max_tokens`.
+    """
+
+    # Mistral's chat template wraps every turn in [INST] ... [/INST] and </s>
+    per_message_tokens = 4
+
+    def __init__(self, max_tokens: int = 1000, count_tokens: Callable[[str], int] = mistral_tokens):
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        self._window: deque[tuple[BaseMessage, int]] = deque()
+        self.tokens = 0
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        return [message for message, _ in self._window]
+
+    def add_messages(self, messages: list[BaseMessage]) -> None:
+        for message in messages:
+            tokens = self.count_tokens(str(message.content)) + self.per_message_tokens
+            self._window.append((message, tokens))
+            self.tokens += tokens
+        while self._window and self.tokens > self.max_tokens:
+            _, tokens = self._window.popleft()
+            self.tokens -= tokens
+
+    def clear(self) -> None:
+        self._window.clear()
+        self.tokens = 0
+
+
+chat_map = SessionRegistry()
 
 
 def get_chat_history(session_id: str, k: int = 4) -> BufferWindowMessageHistory:
@@ -82,6 +147,40 @@ pipeline_with_history = RunnableWithMessageHistory(
 )
 
 
+token_chat_map = SessionRegistry()
+
+
+def get_token_chat_history(session_id: str, max_tokens: int = 1000) -> TokenWindowMessageHistory:
+    if session_id not in token_chat_map:
+        token_chat_map[session_id] = TokenWindowMessageHistory(max_tokens=max_tokens)
+    return token_chat_map[session_id]
+
+
+# same pipeline with a token budget instead of a message count
+pipeline_with_token_history = RunnableWithMessageHistory(
+    pipeline,
+    get_session_history=get_token_chat_history,
+    input_messages_key="query",
+    history_messages_key="history",
+    history_factory_config=[
+        ConfigurableFieldSpec(
+            id="session_id",
+            annotation=str,
+            name="Session ID",
+            description="The session ID to use for the chat history",
+            default="id_default",
+        ),
+        ConfigurableFieldSpec(
+            id="max_tokens",
+            annotation=int,
+            name="Max tokens",
+            description="The token budget for the history",
+            default=1000,
+        ),
+    ],
+)
+
+
 pipeline_with_history.invoke(
     {"query": "Hi, my name is Josh"},
     config={"configurable": {"session_id": "id_k4", "k": 4}},
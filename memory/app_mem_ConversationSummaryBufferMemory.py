@@ -1,5 +1,8 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from langchain_core.runnables import ConfigurableFieldSpec
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.messages import BaseMessage
 from langchain_ollama import ChatOllama
@@ -12,6 +15,7 @@ from langchain_core.prompts import (
     MessagesPlaceholder,
 )
 from langchain_core.runnables.history import RunnableWithMessageHistory
+from session_registry import SessionRegistry
 
 
 llm = ChatOllama(model="mistral", base_url="http://localhost:11434")
@@ -27,71 +31,136 @@ prompt_template = ChatPromptTemplate.from_messages(
 )
 
 
+# summaries of dropped messages
+summary_prompt = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(
+            "Given the existing conversation summary and the new messages, "
+            "generate a new summary of the conversation. Ensuring to maintain "
+            "as much relevant information as possible."
+        ),
+        HumanMessagePromptTemplate.from_template(
+            "Existing conversation summary:\n{existing_summary}\n\n"
+            "New messages:\n{old_messages}"
+        ),
+    ]
+)
+
+# summaries are generated here, off the request path
+summary_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="summary")
+
+
 class ConversationSummaryBufferMessageHistory(BaseChatMessageHistory, BaseModel):
+    """Keeps the last `k` messages verbatim and a running summary of the rest.
+
+    Summaries are generated in the background: messages dropped from the
+    window are queued and summarized `debounce` seconds later, so a burst of
+    turns costs one LLM call. There is at most one summary job per session;
+    messages dropped while it runs are merged into the next job. Every
+    applied summary bumps `version`, and a job whose starting version is
+    stale (e.g. after clear()) is discarded. Queued messages stay in
+    `messages` until their summary lands, so no context is lost meanwhile;
+    a failed summary is retried after `retry_delay` seconds.
+
+    `k=0` keeps no messages verbatim, only the summary.
+    """
+
     messages: list[BaseMessage] = Field(default_factory=list)
     llm: ChatOpenAI = Field(default_factory=ChatOpenAI)
     k: int = Field(default_factory=int)
-
-    def __init__(self, llm: ChatOpenAI, k: int):
-        super().__init__(llm=llm, k=k)
+    debounce: float = 0.5
+    retry_delay: float = 5.0
+    version: int = 0
+    _summary: str | None = PrivateAttr(default=None)
+    _pending: list[BaseMessage] = PrivateAttr(default_factory=list)
+    _window: list[BaseMessage] = PrivateAttr(default_factory=list)
+    _scheduled: bool = PrivateAttr(default=False)
+    _cond: threading.Condition = PrivateAttr(default_factory=threading.Condition)
+
+    def __init__(self, llm: ChatOpenAI, k: int, debounce: float = 0.5):
+        if k < 0:
+            raise ValueError(f"k must be 0 or more, got {k}")
+        super().__init__(llm=llm, k=k, debounce=debounce)
+
+    def _refresh(self) -> None:
+        summary = [SystemMessage(content=self._summary)] if self._summary else []
+        self.messages = summary + self._pending + self._window
 
     def add_messages(self, messages: list[BaseMessage]) -> None:
-        """Add messages to the history, removing any messages beyond
-        the last `k` messages and summarizing the messages that we
-        drop.
+        """Add messages to the history, keeping the last `k` messages and
+        queueing the ones we drop to be summarized in the background.
         """
-        existing_summary: SystemMessage | None = None
-        old_messages: list[BaseMessage] | None = None
-        # see if we already have a summary message
-        if len(self.messages) > 0 and isinstance(self.messages[0], SystemMessage):
-            print(">> Found existing summary")
-            existing_summary = self.messages.pop(0)
-        # add the new messages to the history
-        self.messages.extend(messages)
-        # check if we have too many messages
-        if len(self.messages) > self.k:
-            print(
-                f">> Found {len(self.messages)} messages, dropping "
-                f"oldest {len(self.messages) - self.k} messages."
-            )
-            # pull out the oldest messages...
-            old_messages = self.messages[: self.k]
-            # ...and keep only the most recent messages
-            self.messages = self.messages[-self.k :]
-        if old_messages is None:
-            print(">> No old messages to update summary with")
-            # if we have no old_messages, we have nothing to update in summary
+        with self._cond:
+            self._window.extend(messages)
+            if len(self._window) > self.k:
+                # not [-k:], which keeps everything when k is 0
+                keep_from = len(self._window) - self.k
+                dropped = self._window[:keep_from]
+                print(
+                    f">> Found {len(self._window)} messages, queueing "
+                    f"oldest {len(dropped)} messages for the summary."
+                )
+                self._pending.extend(dropped)
+                self._window = self._window[keep_from:]
+            if self._pending:
+                self._schedule()
+            self._refresh()
+
+    def _schedule(self, delay: float | None = None) -> None:
+        # one job per session at a time, later drops wait for the next one
+        if self._scheduled:
             return
-        # construct the summary chat messages
-        summary_prompt = ChatPromptTemplate.from_messages(
-            [
-                SystemMessagePromptTemplate.from_template(
-                    "Given the existing conversation summary and the new messages, "
-                    "generate a new summary of the conversation. Ensuring to maintain "
-                    "as much relevant information as possible."
-                ),
-                HumanMessagePromptTemplate.from_template(
-                    "Existing conversation summary:\n{existing_summary}\n\n"
-                    "New messages:\n{old_messages}"
-                ),
-            ]
-        )
-        # format the messages and invoke the LLM
-        new_summary = self.llm.invoke(
-            summary_prompt.format_messages(
-                existing_summary=existing_summary, old_messages=old_messages
-            )
-        )
-        print(f">> New summary: {new_summary.content}")
-        # prepend the new summary to the history
-        self.messages = [SystemMessage(content=new_summary.content)] + self.messages
+        self._scheduled = True
+        timer = threading.Timer(self.debounce if delay is None else delay, summary_pool.submit, args=(self._summarize,))
+        timer.daemon = True
+        timer.start()
+
+    def _summarize(self) -> None:
+        with self._cond:
+            version, existing_summary, batch = self.version, self._summary, list(self._pending)
+        new_summary = None
+        if batch:
+            try:
+                new_summary = self.llm.invoke(
+                    summary_prompt.format_messages(
+                        existing_summary=existing_summary, old_messages=batch
+                    )
+                )
+            except Exception as e:
+                # the messages stay queued and are retried below
+                print(f">> Summary failed: {e}")
+        with self._cond:
+            self._scheduled = False
+            if new_summary is not None and version == self.version:
+                print(f">> New summary (v{version + 1}): {new_summary.content}")
+                self.version += 1
+                self._summary = new_summary.content
+                del self._pending[: len(batch)]
+                self._refresh()
+            if self._pending:
+                # messages dropped while this job ran (also after a clear()
+                # made it stale), or the batch again if the summary failed
+                failed = batch and new_summary is None
+                self._schedule(self.retry_delay if failed else None)
+            self._cond.notify_all()
+
+    def wait_for_summary(self, timeout: float | None = None) -> bool:
+        """Block until no summary job is queued or running (for scripts and tests)."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._scheduled, timeout)
 
     def clear(self) -> None:
         """Clear the history."""
-        self.messages = []
+        with self._cond:
+            # a job still in flight sees the new version and drops its result
+            self.version += 1
+            self._summary = None
+            self._pending = []
+            self._window = []
+            self._refresh()
 
 
-chat_map = {}
+chat_map = SessionRegistry()
 
 
 def get_chat_history(
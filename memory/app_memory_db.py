@@ -3,25 +3,40 @@ postgres_chat_history_example.py
 
 Requirements:
     pip install sqlalchemy psycopg2-binary langchain langchain-ollama
+    pip install asyncpg  # only for AsyncPostgresChatMessageHistory
 (Adjust langchain imports to your installed version; this code uses the Runnable-style APIs.)
 """
 
+import atexit
 import datetime
-from typing import List, Dict, Any
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Sequence
 
 from sqlalchemy import (
     create_engine,
     Column,
     Integer,
+    LargeBinary,
     String,
     Text,
     DateTime,
     ForeignKey,
+    Index,
     Table,
     select,
     insert,
     update,
+    delete,
+    func,
+    or_,
+    tuple_,
 )
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import declarative_base, Session, relationship, sessionmaker
 
 # LangChain imports (adjust if your environment differs)
@@ -55,11 +70,202 @@ class SessionMeta(Base):
 class Message(Base):
     __tablename__ = "messages"
     id = Column(Integer, primary_key=True)
-    session_id = Column(String(128), index=True, nullable=False)
-    role = Column(String(16), nullable=False)  # "user" or "ai"
+    session_id = Column(String(128), nullable=False)
+    role = Column(String(16), nullable=False)  # "user", "ai", "system", "tool", ...
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
 
+    # serves "last N" and keyset-paginated reads of one session without a sort,
+    # and every other lookup by session_id; create_all only adds it to new
+    # tables, on an existing one run (the old single-column index only slows inserts):
+    #   CREATE INDEX ix_messages_session_created_id ON messages (session_id, created_at, id);
+    #   DROP INDEX IF EXISTS ix_messages_session_id;
+    __table_args__ = (Index("ix_messages_session_created_id", "session_id", "created_at", "id"),)
+
+
+class MessageArchive(Base):
+    """Messages moved out of the hot table, one zlib-compressed JSON chunk per session per batch."""
+    __tablename__ = "messages_archive"
+    id = Column(Integer, primary_key=True)
+    session_id = Column(String(128), index=True, nullable=False)
+    first_message_id = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+# roles are stored as "user" for human messages and the message type otherwise
+def _role(message_type: str) -> str:
+    return "user" if message_type == "human" else message_type
+
+
+def _message_type(role: str) -> str:
+    return "human" if role == "user" else role
+
+
+# -----------------------
+# Write-behind: batch message inserts across sessions
+# -----------------------
+class MessageWriteBehind:
+    """
+    Queues message rows from every session and writes them from a background
+    thread, one bulk insert per flush: every `flush_interval` seconds, or
+    sooner once `batch_size` rows are waiting.
+
+    At most `max_pending` rows are ever unwritten (add() waits up to
+    `add_timeout` seconds beyond that, then raises TimeoutError), which
+    bounds what a crash can lose; a normal exit flushes everything.
+
+    If a bulk insert fails, its rows are retried one by one so a bad row
+    (too long a role, non-text content) does not hold up the others. A row
+    that keeps failing is dropped after `max_retries` flushes and counted in
+    `rows_dropped`. Connection errors requeue the batch as is, since every
+    row would fail the same way.
+    """
+
+    def __init__(
+        self,
+        db_session_factory,
+        flush_interval: float = 0.5,
+        batch_size: int = 500,
+        max_pending: int = 5000,
+        max_retries: int = 3,
+        add_timeout: float = 30.0,
+    ):
+        self._db_session_factory = db_session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.add_timeout = add_timeout
+        self._pending: List[dict] = []
+        self._inflight: List[dict] = []
+        # id(row) -> failed attempts, for rows that failed on their own
+        self._attempts: Dict[int, int] = {}
+        self._cond = threading.Condition()
+        # held while a batch is being committed, so readers never see it twice
+        self._commit_lock = threading.Lock()
+        # bumped after every flush
+        self.generation = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="message-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, rows: List[dict]):
+        deadline = time.monotonic() + self.add_timeout
+        with self._cond:
+            while len(self._pending) + len(self._inflight) >= self.max_pending and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"write-behind queue still full after {self.add_timeout}s")
+                self._cond.wait(remaining)
+            if self._closed:
+                raise RuntimeError("write-behind writer is closed")
+            self._pending.extend(rows)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _run(self):
+        failed = False
+        while True:
+            with self._cond:
+                # after a failure wait out the interval even if a batch is ready
+                if not self._closed and (failed or len(self._pending) < self.batch_size):
+                    self._cond.wait(self.flush_interval)
+                closed = self._closed
+            failed = not self.flush()
+            if closed:
+                return
+
+    def _insert(self, rows: List[dict]):
+        with self._db_session_factory() as db:
+            db.execute(insert(Message), rows)
+            db.commit()
+
+    def flush(self) -> bool:
+        """Write everything queued so far; False if some rows were queued again."""
+        with self._commit_lock:
+            with self._cond:
+                self._inflight, self._pending = self._pending, []
+            batch = self._inflight
+            if not batch:
+                return True
+            written, retry = batch, []
+            try:
+                self._insert(batch)
+            except OperationalError as e:
+                print(f"Write-behind cannot reach the database, {len(batch)} messages queued again: {e}")
+                written, retry = [], batch
+            except Exception as e:
+                print(f"Write-behind flush of {len(batch)} messages failed, retrying them one by one: {e}")
+                written, retry = self._insert_each(batch)
+            for row in written:
+                self._attempts.pop(id(row), None)
+            with self._cond:
+                self._pending[:0] = retry
+                self._inflight = []
+                self.rows_written += len(written)
+                self.generation += 1
+                self._cond.notify_all()
+            return not retry
+
+    def _insert_each(self, batch: List[dict]):
+        """Insert rows one per transaction; returns (written, rows to retry)."""
+        written, retry = [], []
+        for i, row in enumerate(batch):
+            try:
+                self._insert([row])
+            except OperationalError as e:
+                # the database is unreachable, not the row: try the rest next flush
+                print(f"Write-behind cannot reach the database, {len(batch) - i} messages queued again: {e}")
+                retry.extend(batch[i:])
+                break
+            except Exception as e:
+                attempts = self._attempts.get(id(row), 0) + 1
+                if attempts < self.max_retries:
+                    self._attempts[id(row)] = attempts
+                    retry.append(row)
+                    continue
+                self._attempts.pop(id(row), None)
+                self.rows_dropped += 1
+                print(f"Write-behind dropped a message of session {row['session_id']!r} after {attempts} attempts: {e}")
+            else:
+                written.append(row)
+        return written, retry
+
+    def snapshot(self, session_id: str):
+        """Generation and unwritten rows of one session, taken between flushes."""
+        with self._commit_lock, self._cond:
+            rows = [r for r in (*self._inflight, *self._pending) if r["session_id"] == session_id]
+            return self.generation, rows
+
+    def discard(self, session_id: str):
+        """Drop unwritten rows of one session (waits for a running flush)."""
+        with self._commit_lock, self._cond:
+            for r in self._pending:
+                if r["session_id"] == session_id:
+                    self._attempts.pop(id(r), None)
+            self._pending = [r for r in self._pending if r["session_id"] != session_id]
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        # the last flush may have queued rows again, give them their retries
+        for _ in range(self.max_retries):
+            if self.flush():
+                return
+            time.sleep(self.flush_interval)
+        print(f"Write-behind closed with {len(self._pending)} messages unwritten")
+
 
 # -----------------------
 # Postgres-backed chat history
@@ -68,79 +274,424 @@ class PostgresChatMessageHistory:
     """
     Minimal chat-history object to satisfy RunnableWithMessageHistory expectations:
       - .messages -> list of message-like objects (with .type and .content)
-      - add_user_message(str)
-      - add_ai_message(str)
+      - add_messages(list), add_user_message(str), add_ai_message(str)
       - clear()
+
+    Messages are cached per session in-process: each read of .messages only
+    fetches rows with an id greater than the last one seen, plus the first
+    cached row as a check that the session was not cleared elsewhere.
+
+    With a `writer` (MessageWriteBehind), new messages are queued instead of
+    written inline; .messages still includes them before they are flushed.
+
+    With `k`, .messages is a window of the last k messages, read with one
+    indexed DESC LIMIT query so its cost does not grow with the session.
+    Older history can be browsed with page().
     """
 
-    def __init__(self, db_session_factory, session_id: str):
+    # session_id -> (first row id, last row id, cached messages), least recently used first
+    _cache: "OrderedDict[str, tuple[int, int, List[Any]]]" = OrderedDict()
+    _cache_lock = threading.Lock()
+    cache_max_sessions = 1024
+
+    def __init__(self, db_session_factory, session_id: str, writer: MessageWriteBehind = None, k: int = None):
         self._db_session_factory = db_session_factory
         self.session_id = session_id
+        self._writer = writer
+        self.k = k
 
     # Message container objects compatible with langchain message shape:
     # We'll create simple objects with .type ('human'|'ai') and .content attributes
     class _Msg:
         def __init__(self, type_, content, created_at=None):
-            self.type = type_  # 'human' or 'ai'
+            self.type = type_  # 'human', 'ai', 'system', ...
             self.content = content
             self.created_at = created_at
 
         def to_dict(self):
             return {"type": self.type, "content": self.content, "created_at": self.created_at}
 
+    @classmethod
+    def _to_msg(cls, row: Message) -> _Msg:
+        return cls._Msg(_message_type(row.role), row.content, row.created_at)
+
     @property
     def messages(self) -> List[_Msg]:
-        """Return all messages for this session ordered by created_at."""
+        """Return all messages for this session (the last k with a window) in order."""
+        if self.k is None:
+            return self._with_pending(self._stored_messages)
+        return self.last_messages(self.k)
+
+    def last_messages(self, n: int) -> List[_Msg]:
+        """The most recent n messages, oldest first."""
+        return self._with_pending(lambda: self._last_stored(n))[-n:] if n > 0 else []
+
+    def page(self, limit: int = 50, before=None):
+        """
+        One page of history going back in time, for browsing older messages.
+
+        Returns (messages oldest first, cursor); pass the cursor as `before`
+        to get the page before it, it is None once the start is reached.
+        Each page is one indexed range query, however deep it is.
+        """
+        query = select(Message).where(Message.session_id == self.session_id)
+        if before is not None:
+            query = query.where(tuple_(Message.created_at, Message.id) < tuple_(*before))
+        query = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit)
         with self._db_session_factory() as db:
-            rows = db.execute(
-                select(Message).where(Message.session_id == self.session_id).order_by(Message.created_at)
-            ).scalars().all()
-            return [self._Msg("human" if r.role == "user" else "ai", r.content, r.created_at) for r in rows]
-
-    def add_user_message(self, text: str):
+            rows = db.execute(query).scalars().all()
+        cursor = (rows[-1].created_at, rows[-1].id) if len(rows) == limit else None
+        return [self._to_msg(r) for r in reversed(rows)], cursor
+
+    def _last_stored(self, n: int) -> List[_Msg]:
+        query = (
+            select(Message)
+            .where(Message.session_id == self.session_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(n)
+        )
+        with self._db_session_factory() as db:
+            rows = db.execute(query).scalars().all()
+        return [self._to_msg(r) for r in reversed(rows)]
+
+    def _with_pending(self, read) -> List[_Msg]:
+        """Stored messages from `read()` plus rows still queued in the writer."""
+        if self._writer is None:
+            return read()
+        while True:
+            generation, pending = self._writer.snapshot(self.session_id)
+            stored = read()
+            # a flush committed in between could show its rows twice, so retry
+            if self._writer.generation == generation:
+                break
+        return stored + [self._Msg(_message_type(r["role"]), r["content"], r["created_at"]) for r in pending]
+
+    def _stored_messages(self) -> List[_Msg]:
+        entry, query = self._cached_query(self.session_id)
+        with self._db_session_factory() as db:
+            rows = db.execute(query).scalars().all()
+        messages = self._merge_rows(self.session_id, entry, rows)
+        return messages if messages is not None else self._stored_messages()
+
+    @classmethod
+    def _cached_query(cls, session_id: str):
+        """The cache entry of a session and the query for what it is missing."""
+        with cls._cache_lock:
+            entry = cls._cache.get(session_id)
+        query = select(Message).where(Message.session_id == session_id)
+        if entry is not None:
+            first_id, last_id, _ = entry
+            # new rows, plus the first cached one to detect a clear() by another process
+            query = query.where(or_(Message.id > last_id, Message.id == first_id))
+        return entry, query.order_by(Message.id)
+
+    @classmethod
+    def _merge_rows(cls, session_id: str, entry, rows) -> Optional[List[_Msg]]:
+        """Add fetched rows to the cache and return all messages, or None when
+        the session was cleared since it was cached and must be reloaded."""
+        if entry is None:
+            if not rows:
+                return []
+            first_id, last_id, cached = rows[0].id, None, []
+            new_rows = rows
+        else:
+            first_id, last_id, cached = entry
+            if not rows or rows[0].id != first_id:
+                cls._invalidate(session_id)
+                return None
+            new_rows = rows[1:]
+        cached = cached + [cls._to_msg(r) for r in new_rows]
+        last_id = new_rows[-1].id if new_rows else last_id
+        with cls._cache_lock:
+            cls._cache[session_id] = (first_id, last_id, cached)
+            cls._cache.move_to_end(session_id)
+            while len(cls._cache) > cls.cache_max_sessions:
+                cls._cache.popitem(last=False)
+        return list(cached)
+
+    @classmethod
+    def _invalidate(cls, session_id: str):
+        with cls._cache_lock:
+            cls._cache.pop(session_id, None)
+
+    @staticmethod
+    def _rows(session_id: str, messages: Sequence[Any]) -> List[dict]:
+        now = datetime.datetime.utcnow()
+        return [
+            {
+                "session_id": session_id,
+                "role": _role(m.type),
+                "content": m.content,
+                "created_at": now,
+            }
+            for m in messages
+        ]
+
+    def add_messages(self, messages: Sequence[Any]):
+        """Insert all messages with one bulk insert in a single transaction."""
+        rows = self._rows(self.session_id, messages)
+        if not rows:
+            return
+        if self._writer is not None:
+            self._writer.add(rows)
+            return
         with self._db_session_factory() as db:
-            m = Message(session_id=self.session_id, role="user", content=text, created_at=datetime.datetime.utcnow())
-            db.add(m)
+            db.execute(insert(Message), rows)
             db.commit()
 
+    def add_user_message(self, text: str):
+        self.add_messages([self._Msg("human", text)])
+
     def add_ai_message(self, text: str):
-        with self._db_session_factory() as db:
-            m = Message(session_id=self.session_id, role="ai", content=text, created_at=datetime.datetime.utcnow())
-            db.add(m)
-            db.commit()
+        self.add_messages([self._Msg("ai", text)])
 
     def clear(self):
+        if self._writer is not None:
+            self._writer.discard(self.session_id)
         with self._db_session_factory() as db:
-            db.execute(
-                select(Message).where(Message.session_id == self.session_id).delete(synchronize_session=False)
-            )
+            db.execute(delete(Message).where(Message.session_id == self.session_id))
             db.commit()
+        self._invalidate(self.session_id)
+
+
+# -----------------------
+# Async Postgres-backed chat history
+# -----------------------
+class AsyncPostgresChatMessageHistory:
+    """
+    Same schema and per-session cache as PostgresChatMessageHistory, on an
+    asyncio driver (SQLAlchemy async + asyncpg), so history reads and writes
+    in an async handler overlap with other requests instead of blocking the
+    event loop. RunnableWithMessageHistory uses these methods on ainvoke/astream:
+      - aget_messages()  (alast_messages(n) for a window)
+      - aadd_messages(list)
+      - aclear()
+    """
+
+    def __init__(self, async_session_factory, session_id: str):
+        self._async_session_factory = async_session_factory
+        self.session_id = session_id
+
+    async def aget_messages(self) -> List[Any]:
+        entry, query = PostgresChatMessageHistory._cached_query(self.session_id)
+        async with self._async_session_factory() as db:
+            rows = (await db.execute(query)).scalars().all()
+        messages = PostgresChatMessageHistory._merge_rows(self.session_id, entry, rows)
+        return messages if messages is not None else await self.aget_messages()
+
+    async def alast_messages(self, n: int) -> List[Any]:
+        """The most recent n messages, oldest first, from one DESC LIMIT query."""
+        query = (
+            select(Message)
+            .where(Message.session_id == self.session_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(n)
+        )
+        async with self._async_session_factory() as db:
+            rows = (await db.execute(query)).scalars().all()
+        return [PostgresChatMessageHistory._to_msg(r) for r in reversed(rows)]
+
+    async def aadd_messages(self, messages: Sequence[Any]):
+        """Insert all messages with one bulk insert in a single transaction."""
+        rows = PostgresChatMessageHistory._rows(self.session_id, messages)
+        if not rows:
+            return
+        async with self._async_session_factory() as db:
+            await db.execute(insert(Message), rows)
+            await db.commit()
+
+    async def aclear(self):
+        async with self._async_session_factory() as db:
+            await db.execute(delete(Message).where(Message.session_id == self.session_id))
+            await db.commit()
+        PostgresChatMessageHistory._invalidate(self.session_id)
 
 
 # -----------------------
 # Session metadata helpers (last_visit and doctor)
 # -----------------------
 class SessionStore:
-    def __init__(self, db_session_factory):
+    """
+    Writes are one atomic INSERT ... ON CONFLICT DO UPDATE (set_visits for
+    bulk imports). Reads go through a small in-process TTL cache that every
+    write here updates, so returning-patient lookups usually skip the DB;
+    writes from other processes show up once the entry expires.
+    """
+
+    # rows per upsert statement when importing visits in bulk
+    bulk_chunk_size = 1000
+
+    def __init__(self, db_session_factory, cache_size: int = 1024, cache_ttl: float = 300.0):
         self._db_session_factory = db_session_factory
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        # session_id -> (last visit record or {}, expires_at), least recently used first
+        self._cache: "OrderedDict[str, tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # bumped on every write, so a read that raced one does not cache the old row
+        self._writes = 0
+
+    def _cache_put(self, session_id: str, record: Dict[str, Any]):
+        # callers hold _cache_lock
+        self._cache[session_id] = (record, time.monotonic() + self.cache_ttl)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
 
     def set_visit(self, session_id: str, doctor: str, visit_time: datetime.datetime = None):
         visit_time = visit_time or datetime.datetime.utcnow()
+        self.set_visits([{"session_id": session_id, "last_visit": visit_time, "doctor": doctor}])
+
+    def set_visits(self, visits: Sequence[Dict[str, Any]]):
+        """Upsert many {"session_id", "last_visit", "doctor"} records, e.g. when importing visits."""
+        # one statement may not touch a row twice, keep the last record per session
+        latest = list({v["session_id"]: v for v in visits}.values())
         with self._db_session_factory() as db:
-            doc = db.execute(select(SessionMeta).where(SessionMeta.session_id == session_id)).scalars().first()
-            if doc:
-                doc.last_visit = visit_time
-                doc.doctor = doctor
-            else:
-                db.add(SessionMeta(session_id=session_id, last_visit=visit_time, doctor=doctor))
+            for start in range(0, len(latest), self.bulk_chunk_size):
+                stmt = pg_insert(SessionMeta).values(latest[start:start + self.bulk_chunk_size])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[SessionMeta.session_id],
+                    set_={"last_visit": stmt.excluded.last_visit, "doctor": stmt.excluded.doctor},
+                )
+                db.execute(stmt)
             db.commit()
+        with self._cache_lock:
+            self._writes += 1
+            for v in latest:
+                self._cache_put(v["session_id"], dict(v))
 
     def get_last_visit(self, session_id: str) -> Dict[str, Any]:
+        with self._cache_lock:
+            entry = self._cache.get(session_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._cache.move_to_end(session_id)
+                self.cache_hits += 1
+                return dict(entry[0])
+            self.cache_misses += 1
+            writes = self._writes
         with self._db_session_factory() as db:
             doc = db.execute(select(SessionMeta).where(SessionMeta.session_id == session_id)).scalars().first()
-            if not doc:
-                return {}
-            return {"session_id": doc.session_id, "last_visit": doc.last_visit, "doctor": doc.doctor}
+            record = {"session_id": doc.session_id, "last_visit": doc.last_visit, "doctor": doc.doctor} if doc else {}
+        # unknown sessions are cached too, first visits are looked up as often as returning ones
+        with self._cache_lock:
+            if writes == self._writes:
+                self._cache_put(session_id, record)
+        return dict(record)
+
+
+# -----------------------
+# Retention: archive old messages
+# -----------------------
+class MessageArchiver:
+    """
+    Moves the messages of sessions inactive for longer than `max_age` (their
+    newest message is older than that) from `messages` to `messages_archive`,
+    `batch_size` rows per transaction, so the hot table (and its indexes) only
+    holds live history and each run leaves a bounded amount of dead rows for
+    autovacuum. Batches lock their rows with SKIP LOCKED, so several archivers
+    can run at once. Sessions still in use are never touched.
+
+    When an archived patient comes back, rehydrate() moves their messages
+    back into `messages`, so .messages, page() and last_messages() see the
+    whole history again.
+    """
+
+    def __init__(self, db_session_factory, max_age: datetime.timedelta = datetime.timedelta(days=30), batch_size: int = 1000):
+        self._db_session_factory = db_session_factory
+        self.max_age = max_age
+        self.batch_size = batch_size
+        self.archived = 0
+        self.rehydrated = 0
+
+    def archive_batch(self) -> int:
+        """Archive one batch of messages of inactive sessions; returns how many were moved."""
+        cutoff = datetime.datetime.utcnow() - self.max_age
+        inactive = (
+            select(Message.session_id)
+            .group_by(Message.session_id)
+            .having(func.max(Message.created_at) < cutoff)
+        )
+        with self._db_session_factory() as db:
+            rows = db.execute(
+                select(Message)
+                .where(Message.session_id.in_(inactive))
+                .order_by(Message.session_id, Message.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not rows:
+                return 0
+            by_session: Dict[str, List[Message]] = {}
+            for r in rows:
+                by_session.setdefault(r.session_id, []).append(r)
+            db.execute(insert(MessageArchive), [
+                {
+                    "session_id": session_id,
+                    "first_message_id": chunk[0].id,
+                    "last_message_id": chunk[-1].id,
+                    "message_count": len(chunk),
+                    "payload": zlib.compress(json.dumps([
+                        {"id": r.id, "role": r.role, "content": r.content, "created_at": r.created_at.isoformat()}
+                        for r in chunk
+                    ]).encode()),
+                    "archived_at": datetime.datetime.utcnow(),
+                }
+                for session_id, chunk in by_session.items()
+            ])
+            db.execute(delete(Message).where(Message.id.in_([r.id for r in rows])))
+            db.commit()
+        for session_id in by_session:
+            PostgresChatMessageHistory._invalidate(session_id)
+        self.archived += len(rows)
+        return len(rows)
+
+    def run(self, max_batches: int = None, pause: float = 0.0) -> int:
+        """Archive batches until nothing is left (or `max_batches`), sleeping `pause` between them."""
+        total, batches = 0, 0
+        while max_batches is None or batches < max_batches:
+            moved = self.archive_batch()
+            total += moved
+            batches += 1
+            if moved < self.batch_size:
+                break
+            time.sleep(pause)
+        return total
+
+    def rehydrate(self, session_id: str) -> int:
+        """Move a session's archived messages back into `messages`; returns how many.
+
+        Rows keep their original ids and timestamps, so they sort before the
+        messages added since and paging by (created_at, id) is unchanged.
+        """
+        with self._db_session_factory() as db:
+            chunks = db.execute(
+                select(MessageArchive)
+                .where(MessageArchive.session_id == session_id)
+                .order_by(MessageArchive.first_message_id)
+                .with_for_update()
+            ).scalars().all()
+            if not chunks:
+                return 0
+            rows = [
+                {
+                    "id": m["id"],
+                    "session_id": session_id,
+                    "role": m["role"],
+                    "content": m["content"],
+                    "created_at": datetime.datetime.fromisoformat(m["created_at"]),
+                }
+                for chunk in chunks
+                for m in json.loads(zlib.decompress(chunk.payload))
+            ]
+            db.execute(insert(Message), rows)
+            db.execute(delete(MessageArchive).where(MessageArchive.id.in_([c.id for c in chunks])))
+            db.commit()
+        # the cached history starts at the old first row, reload it with the restored ones
+        PostgresChatMessageHistory._invalidate(session_id)
+        self.rehydrated += len(rows)
+        return len(rows)
 
 
 # -----------------------
@@ -155,6 +706,35 @@ Base.metadata.create_all(bind=engine)
 # session factory
 SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
 
+# Async engine, created on first use so the sync demo does not need asyncpg.
+# One pool is shared by every request: size it to the number of requests
+# expected to touch history at once (each holds a connection only for the
+# duration of one query), with some overflow for bursts.
+ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+ASYNC_POOL_SIZE = 10
+ASYNC_POOL_OVERFLOW = 10
+_async_session_factory = None
+
+
+def get_async_session_factory():
+    global _async_session_factory
+    if _async_session_factory is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            pool_size=ASYNC_POOL_SIZE,
+            max_overflow=ASYNC_POOL_OVERFLOW,
+            pool_pre_ping=True,
+        )
+        _async_session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+    return _async_session_factory
+
+
+def get_async_session_history(session_id: str):
+    # async counterpart of get_session_history, for use from async handlers
+    return AsyncPostgresChatMessageHistory(get_async_session_factory(), session_id=session_id)
+
 
 # -----------------------
 # LangChain pipeline + RunnableWithMessageHistory wiring
@@ -174,10 +754,17 @@ prompt_template = ChatPromptTemplate.from_messages(
 
 pipeline = prompt_template | llm | StrOutputParser()
 
+# set to True to batch history writes on a background thread instead of one
+# transaction per turn
+WRITE_BEHIND = False
+message_writer = MessageWriteBehind(db_session_factory=lambda: SessionLocal()) if WRITE_BEHIND else None
+
 # get_session_history callable required by RunnableWithMessageHistory
 def get_session_history(session_id: str):
     # return a PostgresChatMessageHistory for given session_id
-    return PostgresChatMessageHistory(db_session_factory=lambda: SessionLocal(), session_id=session_id)
+    return PostgresChatMessageHistory(
+        db_session_factory=lambda: SessionLocal(), session_id=session_id, writer=message_writer
+    )
 
 
 pipeline_with_history = RunnableWithMessageHistory(
@@ -190,6 +777,11 @@ pipeline_with_history = RunnableWithMessageHistory(
 # session store for metadata
 session_store = SessionStore(db_session_factory=lambda: SessionLocal())
 
+# retention: run archiver.run() periodically (e.g. from a nightly job) to move
+# sessions idle for RETENTION_DAYS out of the messages table
+RETENTION_DAYS = 30
+archiver = MessageArchiver(db_session_factory=lambda: SessionLocal(), max_age=datetime.timedelta(days=RETENTION_DAYS))
+
 # -----------------------
 # Example application flow
 # -----------------------
@@ -219,6 +811,8 @@ if __name__ == "__main__":
     print("\n=== Returning user (new interaction) ===")
     # Retrieve metadata to construct a prompt (you can also let LLM access stored message history)
     meta = session_store.get_last_visit(session_id)
+    # bring back history the archiver moved out while the patient was away
+    archiver.rehydrate(session_id)
     if meta:
         last_visit_str = meta["last_visit"].strftime("%Y-%m-%d %H:%M:%S") if meta["last_visit"] else "unknown"
         doctor = meta.get("doctor", "unknown")
@@ -8,6 +8,7 @@ from langchain_ollama import ChatOllama
 from langchain.schema.output_parser import StrOutputParser
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
+from session_registry import SessionRegistry
 
 # Initialize model
 llm = ChatOllama(model="mistral", base_url="http://localhost:11434")
@@ -28,7 +29,7 @@ prompt_template = ChatPromptTemplate.from_messages(
 pipeline = prompt_template | llm | StrOutputParser()
 
 # Session memory map
-chat_map = {}
+chat_map = SessionRegistry()
 
 def get_chat_memory(session_id: str):
     """Return or create chat history for a given user session."""
@@ -8,6 +8,7 @@ from langchain_ollama import ChatOllama
 from langchain.schema.output_parser import StrOutputParser
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
+from session_registry import SessionRegistry
 
 
 # -------------------------------
@@ -33,7 +34,7 @@ pipeline = prompt_template | llm | StrOutputParser()
 # -------------------------------
 # 3. Session memory manager
 # -------------------------------
-chat_map = {}
+chat_map = SessionRegistry()
 
 
 def get_chat_memory(session_id: str):
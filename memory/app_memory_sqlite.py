@@ -0,0 +1,306 @@
+"""
+sqlite_chat_history_example.py
+
+Embedded chat history for single-node deployments (no Postgres): the same
+`messages` / `session_meta` schema and history interface as
+PostgresChatMessageHistory in app_memory_db.py, on the standard library's
+sqlite3.
+
+  - WAL mode, so readers never block the writer
+  - one connection per thread; sqlite3 keeps prepared statements per
+    connection, so the fixed SQL below is compiled once per thread
+  - group commit: appends from every thread are written by one writer
+    thread, many per transaction, and add_messages returns once its rows
+    are committed
+
+Needs nothing outside the standard library, so tests can point it at a
+temporary file.
+
+Requirements:
+    none, standard library only
+"""
+
+import datetime
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_meta (
+    id INTEGER PRIMARY KEY,
+    session_id VARCHAR(128) NOT NULL UNIQUE,
+    last_visit DATETIME,
+    doctor VARCHAR(256)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id VARCHAR(128) NOT NULL,
+    role VARCHAR(16) NOT NULL,
+    content TEXT NOT NULL,
+    created_at DATETIME NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_messages_session_created_id ON messages (session_id, created_at, id);
+-- covered by the index above, only adds write cost (dropped from older files)
+DROP INDEX IF EXISTS ix_messages_session_id;
+"""
+
+INSERT_MESSAGE = "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)"
+SELECT_MESSAGES = "SELECT id, role, content, created_at FROM messages WHERE session_id = ? ORDER BY created_at, id"
+SELECT_LAST = (
+    "SELECT id, role, content, created_at FROM messages WHERE session_id = ? "
+    "ORDER BY created_at DESC, id DESC LIMIT ?"
+)
+SELECT_BEFORE = (
+    "SELECT id, role, content, created_at FROM messages WHERE session_id = ? "
+    "AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?"
+)
+DELETE_MESSAGES = "DELETE FROM messages WHERE session_id = ?"
+UPSERT_VISIT = (
+    "INSERT INTO session_meta (session_id, last_visit, doctor) VALUES (?, ?, ?) "
+    "ON CONFLICT (session_id) DO UPDATE SET last_visit = excluded.last_visit, doctor = excluded.doctor"
+)
+SELECT_VISIT = "SELECT session_id, last_visit, doctor FROM session_meta WHERE session_id = ?"
+
+
+class SQLiteChatStore:
+    """
+    One SQLite database shared by every history object and thread.
+
+    Reads use a connection owned by the calling thread. Writes are queued
+    and committed by a single writer thread, up to `batch_size` rows per
+    transaction; a batch is closed after `batch_interval` seconds so a lone
+    append is not held back. If a batch fails, its writes are retried one
+    transaction each, so a bad row only fails the call that sent it. A
+    write that is not committed within `timeout` seconds raises TimeoutError.
+    """
+
+    def __init__(
+        self,
+        path: str = "chat_history.sqlite",
+        batch_size: int = 512,
+        batch_interval: float = 0.002,
+        timeout: float = 30.0,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        # queued writes: (sql, rows, done event, [error])
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.counters = {"rows": 0, "transactions": 0}
+        self.connection().executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._run, name="sqlite-chat-writer", daemon=True)
+        self._writer.start()
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # with WAL, NORMAL only risks the last transactions on power loss, never corruption
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return self.connection().execute(sql, params).fetchall()
+
+    def write(self, sql: str, rows: List[tuple]):
+        """Queue rows for `sql` and wait until they are committed."""
+        done, error = threading.Event(), []
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("SQLiteChatStore is closed")
+            self._queue.append((sql, rows, done, error))
+            self._cond.notify()
+        if not done.wait(self.timeout):
+            # it stays queued and may still be committed later
+            raise TimeoutError(f"SQLite write not committed after {self.timeout}s")
+        if error:
+            raise error[0]
+
+    def _run(self):
+        conn = self.connection()
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+            # give concurrent writers a moment to join this transaction
+            if len(self._queue) < self.batch_size:
+                time.sleep(self.batch_interval)
+            with self._cond:
+                batch, count = [], 0
+                while self._queue and count < self.batch_size:
+                    item = self._queue.popleft()
+                    batch.append(item)
+                    count += len(item[1])
+            try:
+                self._commit(conn, batch)
+            except Exception:
+                # don't let one bad write fail the others: retry each on its own
+                for item in batch:
+                    try:
+                        self._commit(conn, [item])
+                    except Exception as e:
+                        item[3].append(e)
+            for _, _, done, _ in batch:
+                done.set()
+
+    def _commit(self, conn: sqlite3.Connection, batch: list):
+        with conn:
+            for sql, rows, _, _ in batch:
+                conn.executemany(sql, rows)
+        self.counters["rows"] += sum(len(rows) for _, rows, _, _ in batch)
+        self.counters["transactions"] += 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime.datetime]:
+    return datetime.datetime.fromisoformat(value) if value else None
+
+
+class SQLiteChatMessageHistory:
+    """
+    Same interface as PostgresChatMessageHistory:
+      - .messages -> list of message-like objects (with .type and .content)
+      - add_messages(list), add_user_message(str), add_ai_message(str)
+      - clear()
+      - last_messages(n) and page(limit, before) for windows and browsing
+
+    With `k`, .messages is a window of the last k messages.
+    """
+
+    def __init__(self, store: SQLiteChatStore, session_id: str, k: int = None):
+        self._store = store
+        self.session_id = session_id
+        self.k = k
+
+    class _Msg:
+        def __init__(self, type_, content, created_at=None):
+            self.type = type_  # 'human' or 'ai'
+            self.content = content
+            self.created_at = created_at
+
+        def to_dict(self):
+            return {"type": self.type, "content": self.content, "created_at": self.created_at}
+
+    @classmethod
+    def _to_msg(cls, row: tuple) -> _Msg:
+        _, role, content, created_at = row
+        return cls._Msg("human" if role == "user" else role, content, _parse_time(created_at))
+
+    @property
+    def messages(self) -> List[_Msg]:
+        if self.k is not None:
+            return self.last_messages(self.k)
+        return [self._to_msg(r) for r in self._store.execute(SELECT_MESSAGES, (self.session_id,))]
+
+    def last_messages(self, n: int) -> List[_Msg]:
+        """The most recent n messages, oldest first."""
+        rows = self._store.execute(SELECT_LAST, (self.session_id, n))
+        return [self._to_msg(r) for r in reversed(rows)]
+
+    def page(self, limit: int = 50, before=None):
+        """(messages oldest first, cursor for the page before them or None)."""
+        if before is None:
+            rows = self._store.execute(SELECT_LAST, (self.session_id, limit))
+        else:
+            created_at, id_ = before
+            rows = self._store.execute(SELECT_BEFORE, (self.session_id, created_at, id_, limit))
+        # the cursor keeps created_at as stored, so comparisons stay exact
+        cursor = (rows[-1][3], rows[-1][0]) if len(rows) == limit else None
+        return [self._to_msg(r) for r in reversed(rows)], cursor
+
+    def add_messages(self, messages: Sequence[Any]):
+        """Insert all messages in one transaction, shared with concurrent appends."""
+        # same text format SQLAlchemy uses for DateTime on SQLite
+        now = str(datetime.datetime.utcnow())
+        rows = [(self.session_id, "user" if m.type == "human" else m.type, m.content, now) for m in messages]
+        if rows:
+            self._store.write(INSERT_MESSAGE, rows)
+
+    def add_user_message(self, text: str):
+        self.add_messages([self._Msg("human", text)])
+
+    def add_ai_message(self, text: str):
+        self.add_messages([self._Msg("ai", text)])
+
+    def clear(self):
+        self._store.write(DELETE_MESSAGES, [(self.session_id,)])
+
+
+class SQLiteSessionStore:
+    """Session metadata helpers (last_visit and doctor), as SessionStore in app_memory_db.py."""
+
+    def __init__(self, store: SQLiteChatStore):
+        self._store = store
+
+    def set_visit(self, session_id: str, doctor: str, visit_time: datetime.datetime = None):
+        visit_time = visit_time or datetime.datetime.utcnow()
+        self._store.write(UPSERT_VISIT, [(session_id, str(visit_time), doctor)])
+
+    def get_last_visit(self, session_id: str) -> Dict[str, Any]:
+        rows = self._store.execute(SELECT_VISIT, (session_id,))
+        if not rows:
+            return {}
+        session_id, last_visit, doctor = rows[0]
+        return {"session_id": session_id, "last_visit": _parse_time(last_visit), "doctor": doctor}
+
+
+# -----------------------
+# Example: appends per second from several threads
+# -----------------------
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    path = os.path.join(tempfile.mkdtemp(), "chat_history.sqlite")
+    store = SQLiteChatStore(path)
+    threads, turns = 8, 500
+
+    def kiosk(n: int):
+        history = SQLiteChatMessageHistory(store, session_id=f"kiosk_{n}")
+        for i in range(turns):
+            history.add_user_message(f"Patient message {i}")
+            history.add_ai_message(f"Triage reply {i}")
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=kiosk, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    print(f"{store.counters['rows']} messages in {elapsed:.2f}s "
+          f"({store.counters['rows'] / elapsed:.0f}/s, {store.counters['transactions']} transactions)")
+
+    history = SQLiteChatMessageHistory(store, session_id="kiosk_0", k=4)
+    print("Last messages of kiosk_0:")
+    for m in history.messages:
+        print(f"- ({m.type}) {m.content}")
+
+    sessions = SQLiteSessionStore(store)
+    sessions.set_visit("kiosk_0", doctor="Dr. Ada")
+    print("Last visit:", sessions.get_last_visit("kiosk_0"))
+    store.close()
@@ -8,11 +8,27 @@ from langchain_ollama import ChatOllama
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.runnables.config import ConfigurableFieldSpec
+from session_registry import SessionRegistry
+from summary_cache import SummaryCache
 
 
 # Initialize Ollama LLM
 llm = ChatOllama(model="mistral", base_url="http://localhost:11434")
 
+# build summarization prompt
+summary_prompt = ChatPromptTemplate.from_messages([
+    SystemMessagePromptTemplate.from_template(
+        "Given the existing conversation summary and the new messages, "
+        "generate a new summary of the conversation. Ensure that all "
+        "important information is preserved."
+    ),
+    HumanMessagePromptTemplate.from_template(
+        "Existing conversation summary:\n{existing_summary}\n\n"
+        "New messages:\n{messages}"
+    )
+])
+summary_cache = SummaryCache(path="summary_cache.sqlite")
+
 
 class ConversationSummaryMessageHistory(BaseChatMessageHistory):
     def __init__(self, llm: ChatOllama):
@@ -24,19 +40,6 @@ class ConversationSummaryMessageHistory(BaseChatMessageHistory):
         """Add messages and update the summary."""
         self.messages.extend(messages)
 
-        # build summarization prompt
-        summary_prompt = ChatPromptTemplate.from_messages([
-            SystemMessagePromptTemplate.from_template(
-                "Given the existing conversation summary and the new messages, "
-                "generate a new summary of the conversation. Ensure that all "
-                "important information is preserved."
-            ),
-            HumanMessagePromptTemplate.from_template(
-                "Existing conversation summary:\n{existing_summary}\n\n"
-                "New messages:\n{messages}"
-            )
-        ])
-
         # get existing summary (if any)
         existing_summary = ""
         for m in self.messages:
@@ -47,15 +50,16 @@ class ConversationSummaryMessageHistory(BaseChatMessageHistory):
         new_messages_text = "\n".join([m.content for m in messages])
 
         # call LLM
-        new_summary = self.llm.invoke(
+        new_summary = summary_cache.invoke(
+            self.llm,
             summary_prompt.format_messages(
                 existing_summary=existing_summary,
                 messages=new_messages_text,
-            )
+            ),
         )
 
         # replace with a single system summary message
-        self.messages = [SystemMessage(content=new_summary.content)]
+        self.messages = [SystemMessage(content=new_summary)]
 
     def clear(self) -> None:
         """Clear history completely."""
@@ -63,7 +67,7 @@ class ConversationSummaryMessageHistory(BaseChatMessageHistory):
 
 
 # store conversation histories per session
-chat_map = {}
+chat_map = SessionRegistry()
 
 def get_chat_history(session_id: str, llm: ChatOllama) -> ConversationSummaryMessageHistory:
     if session_id not in chat_map:
@@ -106,3 +110,5 @@ pipeline_with_history.invoke(
     {"query": "Hi, my name is Josh"},
     config={"session_id": "id_123", "llm": llm}
 )
+
+print("Summary cache:", summary_cache.stats())
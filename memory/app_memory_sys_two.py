@@ -6,6 +6,24 @@ from langchain.prompts import (
 from langchain_core.messages import SystemMessage, BaseMessage
 from langchain_ollama import ChatOllama
 from pydantic import BaseModel, Field
+from summary_cache import SummaryCache
+
+# SystemMessagePromptTemplate: defines instruction for summarization
+# HumanMessagePromptTemplate: provides current summary + new messages
+summary_template = ChatPromptTemplate.from_messages(
+    [
+        SystemMessagePromptTemplate.from_template(
+            "You are a helpful assistant that maintains a running summary of the conversation."
+            " Update the summary by combining the existing summary with the new message(s)."
+            " Ensure no important detail is lost."
+        ),
+        HumanMessagePromptTemplate.from_template(
+            "Existing conversation summary:\n{existing_summary}\n\n"
+            "New Messages:\n{messages}"
+        ),
+    ]
+)
+summary_cache = SummaryCache(path="summary_cache.sqlite")
 
 # Custom conversation summary class
 class ConversationSummary(BaseModel):
@@ -23,31 +41,17 @@ class ConversationSummary(BaseModel):
         # Extend the conversation with the new incoming messages
         self.messages.extend(message)
 
-        # Build a summarization prompt
-        # SystemMessagePromptTemplate: defines instruction for summarization
-        # HumanMessagePromptTemplate: provides current summary + new messages
-        summary_template = ChatPromptTemplate.from_messages(
-            [
-                SystemMessagePromptTemplate.from_template(
-                    "You are a helpful assistant that maintains a running summary of the conversation."
-                    " Update the summary by combining the existing summary with the new message(s)."
-                    " Ensure no important detail is lost."
-                ),
-                HumanMessagePromptTemplate.from_template(
-                    "Existing conversation summary:\n{existing_summary}\n\n"
-                    "New Messages:\n{messages}"
-                ),
-            ]
-        )
+        existing_summary = "\n".join([m.content for m in self.messages if isinstance(m, SystemMessage)])
 
         # Call the LLM to produce a new summary
-        new_summary = self.llm.invoke(
+        new_summary = summary_cache.invoke(
+            self.llm,
             summary_template.format_messages(
-                existing_summary="\n".join([m.content for m in self.messages if isinstance(m, SystemMessage)]),
+                existing_summary=existing_summary,
                 messages="\n".join([m.content for m in message]),
-            )
+            ),
         )
 
         # Replace stored messages with the updated summary
         # Store summary as a SystemMessage because it represents *context*, not user input
-        self.messages = [SystemMessage(content=new_summary.content)]
+        self.messages = [SystemMessage(content=new_summary)]
@@ -10,6 +10,7 @@ from langchain_core.chat_history import InMemoryChatMessageHistory,BaseChatMessa
 from langchain_core.runnables.history import RunnableWithMessageHistory
 
 from langchain_core.messages import messages_to_dict, messages_from_dict
+from session_registry import SessionRegistry
 
 
 class MongoChatMessageHistory(BaseChatMessageHistory):
@@ -49,7 +50,7 @@ prompt_template = ChatPromptTemplate.from_messages(
 pipeline = prompt_template | llm | StrOutputParser()
 
 # Chat session store
-chat_map = {}
+chat_map = SessionRegistry()
 
 
 def get_chat_memory(session_id: str) ->InMemoryChatMessageHistory:
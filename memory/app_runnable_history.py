@@ -10,6 +10,7 @@ from langchain.schema.runnable import RunnableMap
 from langchain.schema.output_parser import StrOutputParser
 from langchain_core.chat_history import InMemoryChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
+from session_registry import SessionRegistry
 
 
 llm = ChatOllama(model="mistral", base_url="http://localhost:11434")
@@ -83,7 +84,7 @@ pipeline = (
 )
 
 
-chat_map = {}
+chat_map = SessionRegistry()
 
 
 def get_chat_memory(session_id: str):
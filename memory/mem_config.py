@@ -3,6 +3,7 @@ from langchain_core.messages import BaseMessage, SystemMessage
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.runnables.config import ConfigurableFieldSpec
+from session_registry import SessionRegistry
 
 
 # --- Custom Chat History that requires BOTH session_id and llm ---
@@ -19,7 +20,7 @@ class SimpleHistory(BaseChatMessageHistory):
 
 
 # --- Function to create/fetch a chat history ---
-chat_map = {}
+chat_map = SessionRegistry()
 def get_chat_history(session_id: str, llm: ChatOllama) -> SimpleHistory:
     if session_id not in chat_map:
         chat_map[session_id] = SimpleHistory(llm=llm)
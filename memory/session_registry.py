@@ -0,0 +1,245 @@
+"""
+Bounded replacement for the module-level `chat_map = {}` dicts.
+
+    from session_registry import SessionRegistry
+    chat_map = SessionRegistry(max_sessions=1000, ttl=3600, max_bytes=64 * 2**20)
+
+It behaves like the dict it replaces (`in`, `[]`, `[] =`, `del`, `len`,
+`get`), but evicts the least recently used session when there are more
+than `max_sessions` or their estimated size goes over `max_bytes`, and
+drops sessions idle for longer than `ttl` seconds, so a long-running
+process no longer grows with every session it has ever seen. With `spill_dir`,
+evicted and expired sessions are pickled to disk instead of lost and come back on
+their next lookup (histories holding unpicklable objects, e.g. an LLM
+client or a lock, are simply dropped).
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+# rough bytes per message object on top of its content (pydantic model, dicts)
+MESSAGE_OVERHEAD = 600
+
+
+def _messages_of(obj: Any) -> Optional[list]:
+    messages = getattr(obj, "messages", None)
+    if messages is None:
+        # ConversationBufferMemory-style objects keep them on .chat_memory
+        messages = getattr(getattr(obj, "chat_memory", None), "messages", None)
+    return messages if isinstance(messages, list) else None
+
+
+def _message_size(message: Any) -> int:
+    return MESSAGE_OVERHEAD + sys.getsizeof(getattr(message, "content", message))
+
+
+def estimate_size(obj: Any) -> int:
+    """Approximate memory held by one session's history object."""
+    return sys.getsizeof(obj) + sum(_message_size(m) for m in _messages_of(obj) or ())
+
+
+class SessionRegistry:
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl: float = 60 * 60,
+        max_bytes: int = 64 * 2**20,
+        spill_dir: Optional[str] = None,
+        spill_ttl: float = 24 * 60 * 60,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_ttl = spill_ttl
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        # session_id -> [value, last_used, estimated bytes, (messages list, length) when measured],
+        # least recently used first
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self._bytes = 0
+        # the session handed out last is the one most likely to have grown since
+        self._last_used: Optional[str] = None
+        self._lock = threading.RLock()
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "spills": 0,
+            "spill_failures": 0,
+            "restores": 0,
+        }
+
+    # -- dict interface -------------------------------------------------------
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            # the usual `if sid not in chat_map` check is often the only call
+            # before a session grows, so this is where its growth is counted
+            self._remeasure(self._last_used)
+            self._expire(time.monotonic())
+            found = session_id in self._sessions or self._restore(session_id)
+            self.counters["hits" if found else "misses"] += 1
+            return found
+
+    def __getitem__(self, session_id: str) -> Any:
+        with self._lock:
+            if session_id not in self._sessions and not self._restore(session_id):
+                raise KeyError(session_id)
+            entry = self._sessions[session_id]
+            entry[1] = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            self._remeasure(self._last_used)
+            self._last_used = session_id
+            self._evict()
+            return entry[0]
+
+    def __setitem__(self, session_id: str, value: Any) -> None:
+        with self._lock:
+            self._remeasure(self._last_used)
+            self._remove(session_id)
+            entry = self._sessions[session_id] = [value, time.monotonic(), 0, None]
+            self._measure(entry)
+            self._last_used = session_id
+            self._evict()
+
+    def __delitem__(self, session_id: str) -> None:
+        with self._lock:
+            if not self._remove(session_id):
+                raise KeyError(session_id)
+            if self.spill_dir:
+                self._unlink(self._spill_path(session_id))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: str, default: Any = None) -> Any:
+        try:
+            return self[session_id]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._sessions)
+
+    # -- bookkeeping ----------------------------------------------------------
+    def _remove(self, session_id: str):
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return None
+        self._bytes -= entry[2]
+        if self._last_used == session_id:
+            self._last_used = None
+        return entry
+
+    def _remeasure(self, session_id: Optional[str]) -> None:
+        entry = self._sessions.get(session_id) if session_id is not None else None
+        if entry is not None:
+            self._measure(entry)
+
+    def _measure(self, entry: list) -> None:
+        """Update an entry's size. Histories mostly append to the same list,
+        so only the messages added since the last measurement are sized; a
+        replaced or shortened list is measured again in full."""
+        value, _, size, seen = entry
+        messages = _messages_of(value)
+        if seen is not None and messages is seen[0] and len(messages) >= seen[1]:
+            new_size = size + sum(_message_size(m) for m in messages[seen[1]:])
+        else:
+            new_size = estimate_size(value)
+        # the list itself is kept (not its id), so a new list can't be mistaken for it
+        entry[2], entry[3] = new_size, (messages, len(messages)) if messages is not None else None
+        self._bytes += new_size - size
+
+    def _expire(self, now: float) -> None:
+        # lookups move a session to the end of _sessions, so the idle ones
+        # are at the front and the scan stops at the first live session
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if now - entry[1] < self.ttl:
+                break
+            value = self._remove(session_id)[0]
+            self.counters["expirations"] += 1
+            self._spill(session_id, value)
+
+    def _evict(self) -> None:
+        # always keep the newest session, even if it alone is over the budget
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+        ):
+            session_id = next(iter(self._sessions))
+            value = self._remove(session_id)[0]
+            self.counters["evictions"] += 1
+            self._spill(session_id, value)
+
+    # -- spill to disk --------------------------------------------------------
+    def _spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha1(session_id.encode()).hexdigest() + ".pkl")
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _spill(self, session_id: str, value: Any) -> None:
+        if not self.spill_dir:
+            return
+        path = self._spill_path(session_id)
+        try:
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump((session_id, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + ".tmp", path)
+        except Exception:
+            self._unlink(path + ".tmp")
+            self.counters["spill_failures"] += 1
+            return
+        self.counters["spills"] += 1
+        # clear out expired spill files now and then
+        if self.counters["spills"] % 100 == 1:
+            self._sweep_spilled()
+
+    def _restore(self, session_id: str) -> bool:
+        if not self.spill_dir:
+            return False
+        path = self._spill_path(session_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.spill_ttl:
+                self._unlink(path)
+                return False
+            with open(path, "rb") as f:
+                stored_id, value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False
+        self._unlink(path)
+        if stored_id != session_id:
+            return False
+        self.counters["restores"] += 1
+        self[session_id] = value
+        return True
+
+    def _sweep_spilled(self) -> None:
+        cutoff = time.time() - self.spill_ttl
+        for entry in os.scandir(self.spill_dir):
+            try:
+                if entry.name.endswith(".pkl") and entry.stat().st_mtime < cutoff:
+                    self._unlink(entry.path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "estimated_bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                **self.counters,
+            }
@@ -0,0 +1,105 @@
+"""
+Content-addressed cache for conversation summaries.
+
+A summary is a function of the model and the prompt it is given, and that
+prompt already holds the instructions, the existing summary and the new
+messages. So the summary is stored under a hash of the model and the
+formatted prompt. Retries and replayed turns then reuse the earlier result
+instead of calling the LLM. Editing the summary prompt changes the hash, so
+stale summaries are never served.
+
+    from summary_cache import SummaryCache
+    summary_cache = SummaryCache(path="summary_cache.sqlite")
+    summary = summary_cache.invoke(llm, summary_prompt.format_messages(...))
+
+Lookups hit an in-memory LRU tier first, then (with `path`) an SQLite tier
+on disk that survives restarts and is shared by processes on the host.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+
+def model_id(llm: Any) -> str:
+    """Identify the model (and sampling temperature) a summary came from."""
+    model = getattr(llm, "model", None) or getattr(llm, "model_name", None)
+    return f"{type(llm).__name__}:{model}:{getattr(llm, 'temperature', None)}"
+
+
+def summary_key(model: str, prompt: Sequence[Any]) -> str:
+    payload = json.dumps(
+        [model, [[getattr(m, "type", None), getattr(m, "content", m)] for m in prompt]],
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SummaryCache:
+    def __init__(self, path: Optional[str] = None, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries "
+                "(key TEXT PRIMARY KEY, summary TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _put_memory(self, key: str, summary: str) -> None:
+        self._entries[key] = summary
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            summary = self._entries.get(key)
+            if summary is not None:
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return summary
+            if self._conn is not None:
+                row = self._conn.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._put_memory(key, row[0])
+                    self.counters["disk_hits"] += 1
+                    return row[0]
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key: str, summary: str) -> None:
+        with self._lock:
+            self._put_memory(key, summary)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO summaries (key, summary, created_at) VALUES (?, ?, ?)",
+                    (key, summary, time.time()),
+                )
+                self._conn.commit()
+
+    def invoke(self, llm: Any, prompt: Sequence[Any]) -> str:
+        """`llm.invoke(prompt).content`, calling the LLM only for a prompt it has not summarized before."""
+        key = summary_key(model_id(llm), prompt)
+        summary = self.get(key)
+        if summary is None:
+            summary = llm.invoke(prompt).content
+            self.set(key, summary)
+        return summary
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "llm_calls_avoided": self.counters["hits"] + self.counters["disk_hits"],
+        }
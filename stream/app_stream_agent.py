@@ -8,10 +8,16 @@ from langchain_ollama import ChatOllama
 from langchain_core.runnables.base import RunnableSerializable
 from langchain_core.runnables import ConfigurableField
 import json
+import sys
+from pathlib import Path
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 import asyncio
 from langchain.callbacks.base import AsyncCallbackHandler
 
+# incremental JSON parser shared with the capstone API
+sys.path.append(str(Path(__file__).resolve().parents[1] / "langchain-course-main/chapters/09-capstone/api"))
+from partial_json import JSONObjectStream
+
 
 # LLM with Ollama backend
 llm = ChatOllama(
@@ -221,14 +227,25 @@ async def main():
 
     task = asyncio.create_task(agent_executor.invoke("What is 10 + 10", streamer, verbose=True))
 
+    # final_answer arguments are printed as plain answer text while they stream
+    answer_parser = None
+
     async for token in streamer:
         if token == "<<STEP_END>>":
             print("\n", flush=True)
         elif tool_calls := token.message.additional_kwargs.get("tool_calls"):
             if tool_name := tool_calls[0]["function"]["name"]:
                 print(f"Calling {tool_name}...", flush=True)
+                answer_parser = JSONObjectStream({"answer"}) if tool_name == "final_answer" else None
             if tool_args := tool_calls[0]["function"]["arguments"]:
-                print(f"{tool_args}", end="", flush=True)
+                if answer_parser is None:
+                    print(f"{tool_args}", end="", flush=True)
+                    continue
+                for kind, key, value in answer_parser.feed(tool_args):
+                    if kind == "delta":
+                        print(value, end="", flush=True)
+                    elif key == "tools_used":
+                        print(f"\n(tools used: {', '.join(value)})", flush=True)
 
     await task
 